@@ -1,9 +1,130 @@
+import base64
+import io
 import json
+import math
 import os
 import psycopg2
 import psycopg2.extras
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+# Payments list page size; the exact total is computed only on request
+PAYMENTS_PAGE_SIZE = int(os.environ.get('PAYMENTS_PAGE_SIZE', '50'))
+MAX_PAYMENTS_PAGE_SIZE = int(os.environ.get('MAX_PAYMENTS_PAGE_SIZE', '500'))
+
+# Columnar export streams payments from a server-side cursor in record batches of this size
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '50000'))
+# One export response is a self-contained file of at most this many payments; the rest follows the after cursor
+EXPORT_PAGE_ROWS = int(os.environ.get('EXPORT_PAGE_ROWS', '200000'))
+
+# Amount distribution sketches (DDSketch); the accuracy must match V0014__add_payments_amount_sketch.sql
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+DISTRIBUTION_DEFAULT_DAYS = 30
+DISTRIBUTION_DEFAULT_BINS = int(os.environ.get('DISTRIBUTION_DEFAULT_BINS', '20'))
+DISTRIBUTION_MAX_BINS = 100
+
+# Result cache for the dashboard endpoints: fresh for the TTL, then served stale while one refresh runs
+RESULT_CACHE_TTL_SECONDS = {
+    'summary': float(os.environ.get('RESULT_CACHE_TTL_SUMMARY', '30')),
+    'charts': float(os.environ.get('RESULT_CACHE_TTL_CHARTS', '60')),
+    'payments': float(os.environ.get('RESULT_CACHE_TTL_PAYMENTS', '10')),
+    'distribution': float(os.environ.get('RESULT_CACHE_TTL_DISTRIBUTION', '60'))
+}
+RESULT_CACHE_STALE_SECONDS = float(os.environ.get('RESULT_CACHE_STALE_SECONDS', '120'))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '256'))
+
+_result_cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_result_inflight: Dict[str, Future] = {}
+_result_cache_lock = threading.Lock()
+_result_cache_stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'coalesced': 0, 'refreshes': 0, 'errors': 0, 'evictions': 0}
+_result_refresh_executor: Optional[ThreadPoolExecutor] = None
+
+# Connection pool kept at module level so warm invocations reuse connections
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_db_pool_idle: List[Tuple[Any, float]] = []
+_db_pool_lock = threading.Lock()
+_db_pool_stats = {'hits': 0, 'misses': 0, 'discarded': 0}
+
+@contextmanager
+def get_db_connection(database_url: str):
+    '''Выдает соединение из пула модуля и возвращает его после транзакции'''
+    conn = _acquire_db_connection(database_url)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # A connection that cannot even roll back is not returned to the pool
+        try:
+            conn.rollback()
+            reusable = True
+        except psycopg2.Error:
+            reusable = False
+        _release_db_connection(conn, reusable)
+        raise
+    _release_db_connection(conn, True)
+
+def get_db_pool_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики попаданий и промахов пула соединений'''
+    with _db_pool_lock:
+        stats = dict(_db_pool_stats)
+        stats['idle'] = len(_db_pool_idle)
+    total = stats['hits'] + stats['misses']
+    stats['size'] = DB_POOL_SIZE
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+def _acquire_db_connection(database_url: str):
+    while True:
+        with _db_pool_lock:
+            if not _db_pool_idle:
+                _db_pool_stats['misses'] += 1
+                break
+            conn, released_at = _db_pool_idle.pop()
+        if _db_connection_is_healthy(conn, time.monotonic() - released_at):
+            with _db_pool_lock:
+                _db_pool_stats['hits'] += 1
+            return conn
+        # Broken connection: drop it and rebuild on the next loop iteration
+        with _db_pool_lock:
+            _db_pool_stats['discarded'] += 1
+        _close_db_connection(conn)
+    return psycopg2.connect(database_url)
+
+def _release_db_connection(conn, reusable: bool) -> None:
+    if reusable and not conn.closed:
+        with _db_pool_lock:
+            if len(_db_pool_idle) < DB_POOL_SIZE:
+                _db_pool_idle.append((conn, time.monotonic()))
+                return
+    _close_db_connection(conn)
+
+def _db_connection_is_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed:
+        return False
+    # Skip the round trip for connections that were used moments ago
+    if idle_seconds < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _close_db_connection(conn) -> None:
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -33,6 +154,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             params = event.get('queryStringParameters') or {}
             endpoint = params.get('endpoint', 'summary')
             
+            if endpoint == 'metrics':
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'db_pool': get_db_pool_stats(),
+                        'result_cache': get_result_cache_stats()
+                    })
+                }
+            
             # Connect to database
             database_url = os.environ.get('DATABASE_URL')
             if not database_url:
@@ -42,37 +176,34 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Database not configured'})
                 }
             
-            with psycopg2.connect(database_url) as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                    
-                    if endpoint == 'summary':
-                        # Get summary statistics
-                        data = get_summary_stats(cursor)
-                    elif endpoint == 'payments':
-                        # Get payments list with pagination
-                        limit = int(params.get('limit', '50'))
-                        offset = int(params.get('offset', '0'))
-                        payment_type = params.get('type')
-                        data = get_payments_list(cursor, limit, offset, payment_type)
-                    elif endpoint == 'charts':
-                        # Get chart data for last 30 days
-                        days = int(params.get('days', '30'))
-                        data = get_chart_data(cursor, days)
-                    else:
-                        return {
-                            'statusCode': 400,
-                            'headers': {'Access-Control-Allow-Origin': '*'},
-                            'body': json.dumps({'error': 'Invalid endpoint'})
-                        }
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps(data)
-                    }
+            # Dashboard reads go through the result cache; identical concurrent misses query once
+            if endpoint in RESULT_CACHE_TTL_SECONDS:
+                query = normalize_endpoint_params(endpoint, params)
+                body, cache_status = get_cached_result(
+                    f'{endpoint}:{json.dumps(query, sort_keys=True)}',
+                    RESULT_CACHE_TTL_SECONDS[endpoint],
+                    lambda: compute_endpoint_body(database_url, endpoint, query)
+                )
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'X-Cache': cache_status
+                    },
+                    'body': body
+                }
+            
+            if endpoint == 'export':
+                # Columnar export: Parquet or Arrow IPC
+                with get_db_connection(database_url) as conn:
+                    return export_payments_response(conn, params)
+            
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid endpoint'})
+            }
                     
         except Exception as e:
             return {
@@ -91,81 +222,200 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'body': json.dumps({'error': 'Method not allowed'})
     }
 
+def normalize_endpoint_params(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''Приводит параметры запроса к каноническому виду: по нему строится ключ кэша'''
+    if endpoint == 'payments':
+        payment_type = params.get('type')
+        return {
+            'limit': max(1, min(int(params.get('limit', str(PAYMENTS_PAGE_SIZE))), MAX_PAYMENTS_PAGE_SIZE)),
+            'offset': max(0, int(params.get('offset', '0'))),
+            'type': payment_type if payment_type in ('donation', 'investment') else None,
+            'after': params.get('after') or None,
+            'exact_total': params.get('include_total') == 'exact'
+        }
+    if endpoint == 'charts':
+        return {'days': int(params.get('days', '30'))}
+    if endpoint == 'distribution':
+        payment_type = params.get('type')
+        to_day = date.fromisoformat(params['to']) if params.get('to') else datetime.now(timezone.utc).date()
+        if params.get('from'):
+            from_day = date.fromisoformat(params['from'])
+        else:
+            from_day = to_day - timedelta(days=int(params.get('days', str(DISTRIBUTION_DEFAULT_DAYS))) - 1)
+        return {
+            'from': from_day.isoformat(),
+            'to': to_day.isoformat(),
+            'type': payment_type if payment_type in ('donation', 'investment') else None,
+            'bins': max(1, min(int(params.get('bins', str(DISTRIBUTION_DEFAULT_BINS))), DISTRIBUTION_MAX_BINS))
+        }
+    return {}
+
+def get_endpoint_data(cursor, endpoint: str, query: Dict[str, Any]) -> Dict[str, Any]:
+    '''Выполняет запрос эндпоинта дашборда по нормализованным параметрам'''
+    if endpoint == 'summary':
+        # Get summary statistics
+        return get_summary_stats(cursor)
+    if endpoint == 'payments':
+        # Get payments list with keyset pagination
+        return get_payments_list(
+            cursor, query['limit'], query['offset'], query['type'],
+            after=query['after'],
+            exact_total=query['exact_total']
+        )
+    if endpoint == 'distribution':
+        # Merge the daily amount sketches for the date range
+        return get_amount_distribution(cursor, query['from'], query['to'], query['type'], query['bins'])
+    # Get chart data for the requested number of days
+    return get_chart_data(cursor, query['days'])
+
+def compute_endpoint_body(database_url: str, endpoint: str, query: Dict[str, Any]) -> str:
+    with get_db_connection(database_url) as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            return json.dumps(get_endpoint_data(cursor, endpoint, query))
+
+def get_cached_result(key: str, ttl: float, compute) -> Tuple[str, str]:
+    '''Возвращает тело ответа из кэша или вычисляет его один раз для всех одновременных запросов'''
+    if ttl <= 0:
+        return compute(), 'BYPASS'
+    
+    with _result_cache_lock:
+        entry = _result_cache.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry['stored_at']
+            if age < ttl:
+                _result_cache.move_to_end(key)
+                _result_cache_stats['hits'] += 1
+                return entry['body'], 'HIT'
+            if age < ttl + RESULT_CACHE_STALE_SECONDS:
+                # Serve the stale body now; at most one background refresh per key
+                _result_cache_stats['stale_hits'] += 1
+                if key not in _result_inflight:
+                    future = Future()
+                    _result_inflight[key] = future
+                    get_result_refresh_executor().submit(refresh_cached_result, key, future, compute)
+                return entry['body'], 'STALE'
+        
+        future = _result_inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _result_inflight[key] = future
+            _result_cache_stats['misses'] += 1
+        else:
+            _result_cache_stats['coalesced'] += 1
+    
+    if not owner:
+        return future.result(), 'COALESCED'
+    return refresh_cached_result(key, future, compute), 'MISS'
+
+def refresh_cached_result(key: str, future: Future, compute) -> str:
+    '''Вычисляет тело ответа, кладет его в кэш и будит ожидающие запросы'''
+    try:
+        body = compute()
+    except Exception as e:
+        with _result_cache_lock:
+            _result_inflight.pop(key, None)
+            _result_cache_stats['errors'] += 1
+        future.set_exception(e)
+        raise
+    
+    with _result_cache_lock:
+        _result_cache[key] = {'body': body, 'stored_at': time.monotonic()}
+        _result_cache.move_to_end(key)
+        _result_cache_stats['refreshes'] += 1
+        while len(_result_cache) > RESULT_CACHE_MAX_ENTRIES:
+            _result_cache.popitem(last=False)
+            _result_cache_stats['evictions'] += 1
+        _result_inflight.pop(key, None)
+    future.set_result(body)
+    return body
+
+def get_result_refresh_executor() -> ThreadPoolExecutor:
+    # Called with _result_cache_lock held
+    global _result_refresh_executor
+    if _result_refresh_executor is None:
+        _result_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+    return _result_refresh_executor
+
+def get_result_cache_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики попаданий, промахов и склеенных запросов кэша результатов'''
+    with _result_cache_lock:
+        stats = dict(_result_cache_stats)
+        stats['entries'] = len(_result_cache)
+        stats['inflight'] = len(_result_inflight)
+    lookups = stats['hits'] + stats['stale_hits'] + stats['misses'] + stats['coalesced']
+    stats['hit_ratio'] = round((stats['hits'] + stats['stale_hits'] + stats['coalesced']) / lookups, 4) if lookups else 0.0
+    stats['ttl_seconds'] = dict(RESULT_CACHE_TTL_SECONDS)
+    stats['stale_seconds'] = RESULT_CACHE_STALE_SECONDS
+    return stats
+
 def get_summary_stats(cursor):
     '''Получает общую статистику платежей'''
-    # Total statistics
+    # Totals, last 30 days and average in one pass over the non-failed payments
     cursor.execute("""
         SELECT 
             COUNT(*) as total_payments,
             COALESCE(SUM(amount), 0) as total_amount,
-            COUNT(CASE WHEN payment_type = 'donation' THEN 1 END) as total_donations,
-            COUNT(CASE WHEN payment_type = 'investment' THEN 1 END) as total_investments,
-            COALESCE(SUM(CASE WHEN payment_type = 'donation' THEN amount ELSE 0 END), 0) as donations_amount,
-            COALESCE(SUM(CASE WHEN payment_type = 'investment' THEN amount ELSE 0 END), 0) as investments_amount
+            COUNT(*) FILTER (WHERE payment_type = 'donation') as total_donations,
+            COUNT(*) FILTER (WHERE payment_type = 'investment') as total_investments,
+            COALESCE(SUM(amount) FILTER (WHERE payment_type = 'donation'), 0) as donations_amount,
+            COALESCE(SUM(amount) FILTER (WHERE payment_type = 'investment'), 0) as investments_amount,
+            COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '30 days') as recent_payments,
+            COALESCE(SUM(amount) FILTER (WHERE created_at >= NOW() - INTERVAL '30 days'), 0) as recent_amount,
+            COALESCE(AVG(amount), 0) as avg_amount
         FROM payments
         WHERE status != 'failed'
     """)
-    total_stats = cursor.fetchone()
-    
-    # Last 30 days statistics
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as recent_payments,
-            COALESCE(SUM(amount), 0) as recent_amount
-        FROM payments 
-        WHERE created_at >= NOW() - INTERVAL '30 days'
-        AND status != 'failed'
-    """)
-    recent_stats = cursor.fetchone()
-    
-    # Average payment amount
-    cursor.execute("""
-        SELECT COALESCE(AVG(amount), 0) as avg_amount
-        FROM payments 
-        WHERE status != 'failed'
-    """)
-    avg_stats = cursor.fetchone()
+    stats = cursor.fetchone()
     
     return {
-        'total_payments': total_stats['total_payments'],
-        'total_amount_usd': total_stats['total_amount'] / 100,  # Convert cents to dollars
-        'total_donations': total_stats['total_donations'],
-        'total_investments': total_stats['total_investments'],
-        'donations_amount_usd': total_stats['donations_amount'] / 100,
-        'investments_amount_usd': total_stats['investments_amount'] / 100,
-        'recent_payments_30d': recent_stats['recent_payments'],
-        'recent_amount_30d_usd': recent_stats['recent_amount'] / 100,
-        'average_payment_usd': avg_stats['avg_amount'] / 100
+        'total_payments': stats['total_payments'],
+        'total_amount_usd': stats['total_amount'] / 100,  # Convert cents to dollars
+        'total_donations': stats['total_donations'],
+        'total_investments': stats['total_investments'],
+        'donations_amount_usd': stats['donations_amount'] / 100,
+        'investments_amount_usd': stats['investments_amount'] / 100,
+        'recent_payments_30d': stats['recent_payments'],
+        'recent_amount_30d_usd': stats['recent_amount'] / 100,
+        'average_payment_usd': float(stats['avg_amount']) / 100  # AVG returns numeric
     }
 
-def get_payments_list(cursor, limit, offset, payment_type=None):
-    '''Получает список платежей с пагинацией'''
+def get_payments_list(cursor, limit, offset, payment_type=None, after=None, exact_total=False):
+    '''Получает страницу платежей по курсору (created_at, id)'''
     where_clause = "WHERE status != 'failed'"
     params = []
     
     if payment_type and payment_type in ['donation', 'investment']:
         where_clause += " AND payment_type = %s"
         params.append(payment_type)
+    else:
+        payment_type = None
     
-    # Get total count
-    cursor.execute(f"SELECT COUNT(*) as total FROM payments {where_clause}", params)
-    total_count = cursor.fetchone()['total']
+    # The cursor seeks straight into the index, so any page costs the same as the first;
+    # offset is still honoured for old clients that do not pass a cursor
+    keyset_clause = ''
+    page_params = list(params)
+    if after:
+        after_created_at, after_id = decode_payments_cursor(after)
+        keyset_clause = 'AND (created_at, id) < (%s, %s)'
+        page_params.extend([after_created_at, after_id])
+        offset = 0
+    page_params.extend([limit + 1, max(0, offset)])
     
-    # Get payments with pagination
-    query = f"""
+    cursor.execute(f"""
         SELECT 
             id, payment_intent_id, amount, currency, payment_type, status,
             customer_email, customer_name, description,
             created_at, completed_at
         FROM payments 
         {where_clause}
-        ORDER BY created_at DESC 
+        {keyset_clause}
+        ORDER BY created_at DESC, id DESC 
         LIMIT %s OFFSET %s
-    """
-    params.extend([limit, offset])
-    
-    cursor.execute(query, params)
+    """, page_params)
     payments = cursor.fetchall()
+    has_more = len(payments) > limit
+    payments = payments[:limit]
     
     # Convert to dict and format amounts
     payments_list = []
@@ -176,68 +426,315 @@ def get_payments_list(cursor, limit, offset, payment_type=None):
         payment_dict['completed_at'] = payment_dict['completed_at'].isoformat() if payment_dict['completed_at'] else None
         payments_list.append(payment_dict)
     
+    last = payments[-1] if payments else None
     return {
         'payments': payments_list,
-        'total': total_count,
+        'total': count_payments(cursor, payment_type, exact_total),
+        'total_exact': exact_total,
         'limit': limit,
         'offset': offset,
-        'has_more': total_count > offset + limit
+        'has_more': has_more,
+        'next_cursor': encode_payments_cursor(last['created_at'], last['id']) if has_more else None
     }
 
+def count_payments(cursor, payment_type, exact):
+    '''Число платежей списка: точный COUNT по запросу, иначе сумма дневных агрегатов'''
+    type_clause = 'AND payment_type = %s' if payment_type else ''
+    type_params = [payment_type] if payment_type else []
+    if exact:
+        cursor.execute(f"""
+            SELECT COUNT(*) as total FROM payments
+            WHERE status != 'failed' {type_clause}
+        """, type_params)
+    else:
+        # A few rows per day instead of a scan over every payment
+        cursor.execute(f"""
+            SELECT COALESCE(SUM(payments_count), 0)::bigint as total FROM payments_daily_rollup
+            WHERE status != 'failed' {type_clause}
+        """, type_params)
+    return cursor.fetchone()['total']
+
+def encode_payments_cursor(created_at: datetime, payment_id: int) -> str:
+    '''Кодирует позицию (created_at, id) в непрозрачный курсор'''
+    raw = f'{created_at.isoformat()}|{payment_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_payments_cursor(cursor_value: str) -> Tuple[datetime, int]:
+    '''Разбирает курсор, выданный encode_payments_cursor'''
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        created_at, payment_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(payment_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid payments cursor")
+
 def get_chart_data(cursor, days):
     '''Получает данные для графиков за указанное количество дней'''
-    # Daily payments chart
-    cursor.execute("""
-        SELECT 
-            DATE(created_at) as date,
-            COUNT(*) as count,
-            SUM(amount) as amount,
-            COUNT(CASE WHEN payment_type = 'donation' THEN 1 END) as donations,
-            COUNT(CASE WHEN payment_type = 'investment' THEN 1 END) as investments
-        FROM payments 
-        WHERE created_at >= NOW() - INTERVAL '%s days'
-        AND status != 'failed'
-        GROUP BY DATE(created_at)
-        ORDER BY date DESC
-    """, (days,))
-    
-    daily_data = cursor.fetchall()
-    
-    # Payment type distribution
+    # One read of the daily rollup covers both charts; cost grows with days, not payments
+    # Backfills are a maintenance step, not an endpoint: psql -c "SELECT rebuild_payments_daily_rollup('2024-01-01')"
     cursor.execute("""
         SELECT 
+            day as date,
             payment_type,
-            COUNT(*) as count,
-            SUM(amount) as amount
-        FROM payments 
-        WHERE created_at >= NOW() - INTERVAL '%s days'
+            SUM(payments_count)::bigint as count,
+            SUM(amount_sum)::bigint as amount
+        FROM payments_daily_rollup 
+        WHERE day > (NOW() AT TIME ZONE 'UTC')::date - %s
         AND status != 'failed'
-        GROUP BY payment_type
+        GROUP BY day, payment_type
+        HAVING SUM(payments_count) > 0
+        ORDER BY day DESC
     """, (days,))
     
-    type_distribution = cursor.fetchall()
+    rows = cursor.fetchall()
     
     # Format data
     daily_chart = []
-    for row in daily_data:
-        daily_chart.append({
-            'date': row['date'].isoformat() if row['date'] else None,
-            'count': row['count'],
-            'amount_usd': row['amount'] / 100 if row['amount'] else 0,
-            'donations': row['donations'],
-            'investments': row['investments']
-        })
+    type_totals: Dict[str, Dict[str, int]] = {}
+    day_amount = 0
+    for row in rows:
+        if not daily_chart or daily_chart[-1]['date'] != row['date'].isoformat():
+            daily_chart.append({
+                'date': row['date'].isoformat(),
+                'count': 0,
+                'amount_usd': 0,
+                'donations': 0,
+                'investments': 0
+            })
+            day_amount = 0
+        day_entry = daily_chart[-1]
+        day_entry['count'] += row['count']
+        day_amount += row['amount']
+        day_entry['amount_usd'] = day_amount / 100
+        if row['payment_type'] == 'donation':
+            day_entry['donations'] += row['count']
+        elif row['payment_type'] == 'investment':
+            day_entry['investments'] += row['count']
+        
+        totals = type_totals.setdefault(row['payment_type'], {'count': 0, 'amount': 0})
+        totals['count'] += row['count']
+        totals['amount'] += row['amount']
     
     type_chart = []
-    for row in type_distribution:
+    for payment_type, totals in sorted(type_totals.items()):
         type_chart.append({
-            'type': row['payment_type'],
-            'count': row['count'],
-            'amount_usd': row['amount'] / 100 if row['amount'] else 0
+            'type': payment_type,
+            'count': totals['count'],
+            'amount_usd': totals['amount'] / 100
         })
     
     return {
         'daily_payments': daily_chart,
         'payment_types': type_chart,
         'period_days': days
-    }
\ No newline at end of file
+    }
+
+def export_payments_response(conn, params):
+    '''Выгружает платежи в Parquet или Arrow IPC с фильтрами по датам и типу'''
+    export_format = params.get('format', 'parquet')
+    if export_format not in ('parquet', 'arrow'):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid export format'})
+        }
+    
+    # pyarrow is heavy; import it only for exports
+    try:
+        import pyarrow
+    except ImportError:
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Arrow library not available'})
+        }
+    
+    from_day = date.fromisoformat(params['from']) if params.get('from') else None
+    to_day = date.fromisoformat(params['to']) if params.get('to') else None
+    payment_type = params.get('type')
+    limit = max(1, min(int(params.get('limit', str(EXPORT_PAGE_ROWS))), EXPORT_PAGE_ROWS))
+    
+    # The body is buffered and base64-encoded, so it is capped at one page of rows
+    sink = io.BytesIO()
+    rows_count, next_cursor = write_payments_export(
+        conn, export_format, sink, from_day, to_day, payment_type, limit, params.get('after')
+    )
+    
+    suffix = f"_{from_day or 'start'}_{to_day or 'now'}"
+    filename = f"payments{suffix}.{export_format}"
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/vnd.apache.parquet' if export_format == 'parquet' else 'application/vnd.apache.arrow.file',
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Export-Rows': str(rows_count),
+            'X-Next-Cursor': next_cursor or '',
+            'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Rows, X-Next-Cursor',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': True,
+        'body': base64.b64encode(sink.getvalue()).decode('ascii')
+    }
+
+def write_payments_export(conn, export_format, sink, from_day=None, to_day=None, payment_type=None,
+                          limit=None, after=None) -> Tuple[int, Optional[str]]:
+    '''Пишет до limit платежей после курсора after в поток пачками записей Arrow, держа в памяти одну пачку строк'''
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    
+    schema = pyarrow.schema([
+        ('id', pyarrow.int64()),
+        ('payment_intent_id', pyarrow.string()),
+        ('amount', pyarrow.int64()),
+        ('currency', pyarrow.string()),
+        ('payment_type', pyarrow.string()),
+        ('status', pyarrow.string()),
+        ('customer_email', pyarrow.string()),
+        ('customer_name', pyarrow.string()),
+        ('description', pyarrow.string()),
+        ('metadata', pyarrow.string()),
+        ('created_at', pyarrow.timestamp('us', tz='UTC')),
+        ('completed_at', pyarrow.timestamp('us', tz='UTC'))
+    ])
+    
+    filters = ["status != 'failed'"]
+    query_params: List[Any] = []
+    if from_day:
+        filters.append("created_at >= %s::timestamp AT TIME ZONE 'UTC'")
+        query_params.append(from_day)
+    if to_day:
+        filters.append("created_at < (%s::date + 1)::timestamp AT TIME ZONE 'UTC'")
+        query_params.append(to_day)
+    if payment_type in ('donation', 'investment'):
+        filters.append("payment_type = %s")
+        query_params.append(payment_type)
+    if after:
+        after_created_at, after_id = decode_payments_cursor(after)
+        filters.append("(created_at, id) > (%s, %s)")
+        query_params.extend([after_created_at, after_id])
+    limit_clause = ''
+    if limit is not None:
+        # One extra row tells whether another page follows
+        limit_clause = 'LIMIT %s'
+        query_params.append(limit + 1)
+    
+    if export_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pyarrow.ipc.new_file(sink, schema)
+    
+    rows_count = 0
+    last_row = None
+    has_more = False
+    try:
+        with conn.cursor(name='payments_export') as export_cursor:
+            export_cursor.itersize = EXPORT_BATCH_SIZE
+            export_cursor.execute(f"""
+                SELECT 
+                    id, payment_intent_id, amount, currency, payment_type, status,
+                    customer_email, customer_name, description, metadata::text,
+                    created_at, completed_at
+                FROM payments
+                WHERE {' AND '.join(filters)}
+                ORDER BY created_at, id
+                {limit_clause}
+            """, query_params)
+            
+            while not has_more:
+                batch = export_cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if limit is not None and rows_count + len(batch) > limit:
+                    batch = batch[:limit - rows_count]
+                    has_more = True
+                if not batch:
+                    break
+                # Rows are transposed into columns once per batch, then handed to Arrow
+                columns = list(zip(*batch))
+                writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                    [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                rows_count += len(batch)
+                last_row = batch[-1]
+    finally:
+        writer.close()
+    next_cursor = encode_payments_cursor(last_row[10], last_row[0]) if has_more else None
+    return rows_count, next_cursor
+
+def get_amount_distribution(cursor, from_day, to_day, payment_type, bins):
+    '''Оценивает медиану, p90, p99 и гистограмму сумм, сливая дневные скетчи за период'''
+    type_clause = 'AND r.payment_type = %s' if payment_type else ''
+    query_params: List[Any] = [from_day, to_day]
+    if payment_type:
+        query_params.append(payment_type)
+    
+    # Merging DDSketches is adding counts per bucket index
+    cursor.execute(f"""
+        SELECT bucket.key::integer as bucket, SUM(bucket.value::bigint)::bigint as count
+        FROM payments_daily_rollup r
+        CROSS JOIN LATERAL jsonb_each_text(r.amount_sketch) bucket
+        WHERE r.day BETWEEN %s AND %s
+        AND r.status != 'failed'
+        {type_clause}
+        GROUP BY 1
+        ORDER BY 1
+    """, query_params)
+    buckets = [(row['bucket'], row['count']) for row in cursor.fetchall()]
+    total = sum(count for _, count in buckets)
+    
+    result = {
+        'from': from_day,
+        'to': to_day,
+        'type': payment_type,
+        'count': total,
+        'relative_accuracy': SKETCH_RELATIVE_ACCURACY,
+        'min_usd': None,
+        'median_usd': None,
+        'p90_usd': None,
+        'p99_usd': None,
+        'max_usd': None,
+        'histogram': []
+    }
+    if not total:
+        return result
+    
+    result['min_usd'] = round(sketch_bucket_value(buckets[0][0]) / 100, 2)
+    result['median_usd'] = round(sketch_quantile(buckets, total, 0.5) / 100, 2)
+    result['p90_usd'] = round(sketch_quantile(buckets, total, 0.9) / 100, 2)
+    result['p99_usd'] = round(sketch_quantile(buckets, total, 0.99) / 100, 2)
+    result['max_usd'] = round(sketch_bucket_value(buckets[-1][0]) / 100, 2)
+    result['histogram'] = build_sketch_histogram(buckets, bins)
+    return result
+
+def sketch_bucket_value(bucket: int) -> float:
+    '''Оценка суммы в центах для корзины: середина (gamma^(i-1), gamma^i] с относительной ошибкой не больше точности скетча'''
+    return 2 * SKETCH_GAMMA ** bucket / (SKETCH_GAMMA + 1)
+
+def sketch_quantile(buckets: List[Tuple[int, int]], total: int, quantile: float) -> float:
+    rank = quantile * (total - 1)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen > rank:
+            return sketch_bucket_value(bucket)
+    return sketch_bucket_value(buckets[-1][0])
+
+def build_sketch_histogram(buckets: List[Tuple[int, int]], bins: int) -> List[Dict[str, Any]]:
+    '''Сводит корзины скетча в bins интервалов, равных в логарифмической шкале'''
+    first, last = buckets[0][0], buckets[-1][0]
+    width = max(1, math.ceil((last - first + 1) / bins))
+    histogram = []
+    for bucket, count in buckets:
+        index = (bucket - first) // width
+        if not histogram or histogram[-1]['index'] != index:
+            low = first + index * width
+            histogram.append({
+                'index': index,
+                'lower_usd': round(SKETCH_GAMMA ** (low - 1) / 100, 2),
+                'upper_usd': round(SKETCH_GAMMA ** (low + width - 1) / 100, 2),
+                'count': 0
+            })
+        histogram[-1]['count'] += count
+    for entry in histogram:
+        del entry['index']
+    return histogram
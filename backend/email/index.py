@@ -20,6 +20,13 @@ class PaymentNotificationRequest(BaseModel):
     payer_email: Optional[EmailStr] = Field(default=None, description="Email плательщика")
     description: Optional[str] = Field(default=None, description="Описание платежа")
 
+class PaymentBatchNotificationRequest(BaseModel):
+    campaign: Optional[str] = Field(default=None, description="Название кампании")
+    created_count: int = Field(..., ge=0, description="Создано платежей")
+    failed_count: int = Field(default=0, ge=0, description="Не создано платежей")
+    totals: Dict[str, int] = Field(default_factory=dict, description="Суммы в центах по валютам")
+    by_type: Dict[str, int] = Field(default_factory=dict, description="Число платежей по типам")
+
 def handler(event, context):
     '''
     Business: Отправляет email уведомления через SendGrid
@@ -67,6 +74,11 @@ def handler(event, context):
                 payment_req = PaymentNotificationRequest(**body_data)
                 result = send_payment_notification(payment_req, sendgrid_api_key)
                 
+            elif action == 'payment_batch_notification':
+                # Сводное уведомление об импорте пачки платежей
+                batch_req = PaymentBatchNotificationRequest(**body_data)
+                result = send_payment_batch_notification(batch_req, sendgrid_api_key)
+                
             else:
                 # Обычная отправка email
                 email_req = EmailRequest(**body_data)
@@ -204,4 +216,70 @@ def send_payment_notification(payment_req: PaymentNotificationRequest, api_key:
         return {
             'success': False,
             'error': f'Failed to send payment notification: {str(e)}'
+        }
+
+def send_payment_batch_notification(batch_req: PaymentBatchNotificationRequest, api_key: str) -> Dict[str, Any]:
+    '''Отправляет одно сводное уведомление о пачке платежей'''
+    try:
+        notification_email = os.environ.get('NOTIFICATION_EMAIL')
+        if not notification_email:
+            return {
+                'success': False,
+                'error': 'Notification email not configured'
+            }
+        
+        totals_formatted = ', '.join(
+            f"${amount / 100:.2f} {currency.upper()}" for currency, amount in sorted(batch_req.totals.items())
+        ) or '$0.00'
+        type_names = {'donation': 'Пожертвования', 'investment': 'Инвестиции'}
+        type_rows = ''.join(
+            f'<p style="margin: 5px 0;"><strong>{type_names.get(payment_type, payment_type.title())}:</strong> {count}</p>'
+            for payment_type, count in sorted(batch_req.by_type.items())
+        )
+        
+        # HTML содержимое письма
+        html_content = f'''
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <h2 style="color: #7c3aed; text-align: center;">📦 Импорт платежей завершен</h2>
+            
+            <div style="background: linear-gradient(135deg, #7c3aed, #ec4899); color: white; padding: 20px; border-radius: 10px; margin: 20px 0;">
+                <h3 style="margin: 0 0 15px 0;">Итоги пачки:</h3>
+                {f'<p style="margin: 5px 0;"><strong>Кампания:</strong> {batch_req.campaign}</p>' if batch_req.campaign else ''}
+                <p style="margin: 5px 0;"><strong>Создано платежей:</strong> {batch_req.created_count}</p>
+                <p style="margin: 5px 0;"><strong>С ошибкой:</strong> {batch_req.failed_count}</p>
+                <p style="margin: 5px 0;"><strong>Сумма:</strong> {totals_formatted}</p>
+                {type_rows}
+            </div>
+            
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="https://dashboard.stripe.com/payments" 
+                   style="background: #7c3aed; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">
+                    Открыть Stripe Dashboard
+                </a>
+            </div>
+        </div>
+        '''
+        
+        sg = sendgrid.SendGridAPIClient(api_key=api_key)
+        
+        from_email = Email("noreply@poehali.dev", "Payment System")
+        to_email = To(notification_email)
+        subject = f"🔔 Импорт платежей: {batch_req.created_count} на {totals_formatted}"
+        content = Content("text/html", html_content)
+        
+        mail = Mail(from_email, to_email, subject, content)
+        
+        response = sg.client.mail.send.post(request_body=mail.get())
+        
+        return {
+            'success': True,
+            'message': 'Payment batch notification sent successfully',
+            'status_code': response.status_code,
+            'sent_to': notification_email
+        }
+        
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Failed to send payment batch notification: {str(e)}'
         }
\ No newline at end of file
@@ -1,12 +1,150 @@
+import base64
+import csv
+import functools
+import gzip
+import hashlib
+import io
 import json
 import os
 import psycopg2
 import psycopg2.extras
 import random
+import secrets
 import string
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Optional, List, Tuple
 from datetime import datetime, timedelta
 
+# Upper bound for one add_participants batch
+MAX_BATCH_PARTICIPANTS = int(os.environ.get('MAX_BATCH_PARTICIPANTS', '5000'))
+
+# Ticket codes "LT-AAA000" are a keyed permutation of a per-round sequence number
+LOTTERY_TICKET_KEY = os.environ.get('LOTTERY_TICKET_KEY', '')
+TICKET_LETTER_SPACE = 26 ** 3
+TICKET_DIGIT_SPACE = 10 ** 3
+TICKET_SPACE = TICKET_LETTER_SPACE * TICKET_DIGIT_SPACE
+TICKET_PERMUTATION_ROUNDS = 4
+
+_TICKET_LETTERS = [a + b + c for a in string.ascii_uppercase for b in string.ascii_uppercase for c in string.ascii_uppercase]
+_TICKET_DIGITS = [f'{n:03d}' for n in range(TICKET_DIGIT_SPACE)]
+
+# Participants listing page size and server-side cursor batch size
+PARTICIPANTS_PAGE_SIZE = int(os.environ.get('PARTICIPANTS_PAGE_SIZE', '100'))
+MAX_PARTICIPANTS_PAGE_SIZE = int(os.environ.get('MAX_PARTICIPANTS_PAGE_SIZE', '1000'))
+PARTICIPANTS_FETCH_SIZE = int(os.environ.get('PARTICIPANTS_FETCH_SIZE', '200'))
+
+# Winners history returns at most this many rounds per request
+HISTORY_DEFAULT_ROUNDS = int(os.environ.get('HISTORY_DEFAULT_ROUNDS', '10'))
+HISTORY_MAX_ROUNDS = int(os.environ.get('HISTORY_MAX_ROUNDS', '50'))
+
+# Round export reads participants from a server-side cursor in batches of this size
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '2000'))
+# One export response holds at most this many participants; the rest is fetched with the after cursor
+EXPORT_PAGE_ROWS = int(os.environ.get('EXPORT_PAGE_ROWS', '50000'))
+EXPORT_CSV_COLUMNS = [
+    'participant_id', 'payment_id', 'payment_intent_id', 'email',
+    'investment_amount', 'tickets_count', 'ticket_numbers', 'joined_at'
+]
+
+# Status responses are served from memory for this many seconds (0 disables the cache)
+STATUS_CACHE_TTL_SECONDS = float(os.environ.get('STATUS_CACHE_TTL_SECONDS', '5'))
+
+_status_cache: Dict[str, Any] = {'entry': None, 'generation': 0}
+_status_cache_lock = threading.Lock()
+_status_cache_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0, 'max_served_age_seconds': 0.0}
+
+# Completed rounds never change: their winners/participants responses are cached without expiry
+IMMUTABLE_CACHE_MAX_ENTRIES = int(os.environ.get('IMMUTABLE_CACHE_MAX_ENTRIES', '512'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_immutable_cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_immutable_cache_lock = threading.Lock()
+_immutable_cache_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+
+# Connection pool kept at module level so warm invocations reuse connections
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_db_pool_idle: List[Tuple[Any, float]] = []
+_db_pool_lock = threading.Lock()
+_db_pool_stats = {'hits': 0, 'misses': 0, 'discarded': 0}
+
+@contextmanager
+def get_db_connection(database_url: str):
+    '''Выдает соединение из пула модуля и возвращает его после транзакции'''
+    conn = _acquire_db_connection(database_url)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # A connection that cannot even roll back is not returned to the pool
+        try:
+            conn.rollback()
+            reusable = True
+        except psycopg2.Error:
+            reusable = False
+        _release_db_connection(conn, reusable)
+        raise
+    _release_db_connection(conn, True)
+
+def get_db_pool_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики попаданий и промахов пула соединений'''
+    with _db_pool_lock:
+        stats = dict(_db_pool_stats)
+        stats['idle'] = len(_db_pool_idle)
+    total = stats['hits'] + stats['misses']
+    stats['size'] = DB_POOL_SIZE
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+def _acquire_db_connection(database_url: str):
+    while True:
+        with _db_pool_lock:
+            if not _db_pool_idle:
+                _db_pool_stats['misses'] += 1
+                break
+            conn, released_at = _db_pool_idle.pop()
+        if _db_connection_is_healthy(conn, time.monotonic() - released_at):
+            with _db_pool_lock:
+                _db_pool_stats['hits'] += 1
+            return conn
+        # Broken connection: drop it and rebuild on the next loop iteration
+        with _db_pool_lock:
+            _db_pool_stats['discarded'] += 1
+        _close_db_connection(conn)
+    return psycopg2.connect(database_url)
+
+def _release_db_connection(conn, reusable: bool) -> None:
+    if reusable and not conn.closed:
+        with _db_pool_lock:
+            if len(_db_pool_idle) < DB_POOL_SIZE:
+                _db_pool_idle.append((conn, time.monotonic()))
+                return
+    _close_db_connection(conn)
+
+def _db_connection_is_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed:
+        return False
+    # Skip the round trip for connections that were used moments ago
+    if idle_seconds < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _close_db_connection(conn) -> None:
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage charity lottery system with prize fund and ticket generation
@@ -23,12 +161,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
+    params = event.get('queryStringParameters') or {}
+    
+    # Pool metrics are served without touching the database
+    if method == 'GET' and params.get('action') == 'metrics':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'db_pool': get_db_pool_stats(),
+                'status_cache': get_status_cache_stats(),
+                'immutable_cache': get_immutable_cache_stats()
+            })
+        }
+    
+    # Public status polling is answered from memory while the cached entry is fresh
+    if method == 'GET' and params.get('action', 'status') == 'status':
+        cached_status, cache_generation = get_cached_status()
+        if cached_status:
+            return build_status_response(event, cached_status)
+    
+    # Historical rounds are answered from the never-expiring cache
+    immutable_key = get_immutable_round_key(params) if method == 'GET' else None
+    if immutable_key:
+        cached_round = get_immutable_round_entry(immutable_key)
+        if cached_round:
+            return build_immutable_response(event, cached_round)
+    
     # Connect to database
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
@@ -39,22 +207,45 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        with psycopg2.connect(database_url) as conn:
+        with get_db_connection(database_url) as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
                 
                 if method == 'GET':
                     # Get current lottery status and prize fund
-                    params = event.get('queryStringParameters') or {}
                     action = params.get('action', 'status')
                     
                     if action == 'status':
                         data = get_lottery_status(cursor)
+                        entry = store_cached_status(json.dumps(data), cache_generation)
+                        return build_status_response(event, entry)
                     elif action == 'participants':
                         round_num = int(params.get('round', '0'))
-                        data = get_lottery_participants(cursor, round_num)
+                        limit = int(params.get('limit', str(PARTICIPANTS_PAGE_SIZE)))
+                        limit = max(1, min(limit, MAX_PARTICIPANTS_PAGE_SIZE))
+                        body = get_lottery_participants(cursor, conn, round_num, limit, params.get('after'))
+                        if immutable_key and is_round_completed(cursor, round_num):
+                            return build_immutable_response(event, store_immutable_round_entry(immutable_key, body))
+                        return {
+                            'statusCode': 200,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': body
+                        }
                     elif action == 'winners':
                         round_num = int(params.get('round', '0'))
                         data = get_lottery_winners(cursor, round_num)
+                        if immutable_key and is_round_completed(cursor, round_num):
+                            body = json.dumps(data)
+                            return build_immutable_response(event, store_immutable_round_entry(immutable_key, body))
+                    elif action == 'history':
+                        data = get_lottery_history(cursor, params)
+                    elif action == 'export':
+                        return export_round_response(cursor, conn, params)
+                    elif action == 'ticket':
+                        round_num = int(params.get('round', '0'))
+                        data = get_ticket_owner(cursor, round_num, params.get('ticket', ''))
                     else:
                         return {
                             'statusCode': 400,
@@ -79,6 +270,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     if action == 'add_participant':
                         # Add investment as lottery participant
                         result = add_lottery_participant(cursor, conn, body_data)
+                    elif action == 'add_participants':
+                        # Register a batch of investments in one transaction
+                        result = add_lottery_participants(cursor, conn, body_data)
                     elif action == 'draw_winners':
                         # Conduct lottery draw
                         result = conduct_lottery_draw(cursor, conn, body_data)
@@ -121,72 +315,45 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
 def get_lottery_status(cursor):
     '''Получает текущий статус лотереи и призового фонда'''
-    # Get current lottery round
+    # Running totals are maintained by a trigger on payments, so this is a read-only lookup
     cursor.execute("""
         SELECT 
-            id, total_investment_amount, prize_fund_1, prize_fund_2, prize_fund_3,
-            total_participants, current_round, draw_date, is_active
-        FROM lottery 
-        WHERE is_active = true 
-        ORDER BY current_round DESC 
-        LIMIT 1
+            l.id, l.current_round, l.draw_date, l.is_active,
+            f.total_investment_amount, f.total_investors
+        FROM lottery_fund_totals f
+        LEFT JOIN LATERAL (
+            SELECT id, current_round, draw_date, is_active
+            FROM lottery 
+            WHERE is_active = true 
+            ORDER BY current_round DESC 
+            LIMIT 1
+        ) l ON true
+        WHERE f.id = 1
     """)
     
     lottery = cursor.fetchone()
     
-    if not lottery:
+    if not lottery or lottery['id'] is None:
         # Create initial lottery if not exists
         cursor.execute("""
             INSERT INTO lottery (
                 total_investment_amount, prize_fund_1, prize_fund_2, prize_fund_3,
                 total_participants, current_round, is_active
             ) VALUES (0, 0, 0, 0, 0, 1, true)
-            RETURNING *
+            RETURNING id, current_round, draw_date, is_active
         """)
-        lottery = cursor.fetchone()
-    
-    # Calculate current totals from payments
-    cursor.execute("""
-        SELECT 
-            COALESCE(SUM(amount), 0) as total_invested,
-            COUNT(*) as total_investors
-        FROM payments 
-        WHERE payment_type = 'investment' 
-        AND status = 'succeeded'
-    """)
-    
-    current_stats = cursor.fetchone()
+        created = cursor.fetchone()
+        lottery = dict(lottery or {'total_investment_amount': 0, 'total_investors': 0})
+        lottery.update(created)
     
     # Calculate prize amounts (10%, 3%, 1% of total investment)
-    total_amount = current_stats['total_invested'] if current_stats else 0
-    prize_1 = int(total_amount * 0.10)  # 10%
-    prize_2 = int(total_amount * 0.03)  # 3%
-    prize_3 = int(total_amount * 0.01)  # 1%
-    
-    # Update lottery with current amounts
-    cursor.execute("""
-        UPDATE lottery 
-        SET 
-            total_investment_amount = %s,
-            prize_fund_1 = %s,
-            prize_fund_2 = %s,
-            prize_fund_3 = %s,
-            total_participants = %s,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
-    """, (
-        total_amount,
-        prize_1,
-        prize_2, 
-        prize_3,
-        current_stats['total_investors'] if current_stats else 0,
-        lottery['id']
-    ))
+    total_amount = lottery['total_investment_amount'] or 0
+    prize_1, prize_2, prize_3 = calculate_prize_funds(total_amount)
     
     return {
         'current_round': lottery['current_round'],
         'total_investment_usd': total_amount / 100,
-        'total_participants': current_stats['total_investors'] if current_stats else 0,
+        'total_participants': lottery['total_investors'] or 0,
         'prize_fund_1_usd': prize_1 / 100,
         'prize_fund_2_usd': prize_2 / 100,
         'prize_fund_3_usd': prize_3 / 100,
@@ -201,8 +368,159 @@ def get_lottery_status(cursor):
         }
     }
 
+def get_cached_status() -> Tuple[Optional[Dict[str, Any]], int]:
+    '''Возвращает свежую запись кеша статуса и текущее поколение кеша'''
+    now = time.monotonic()
+    with _status_cache_lock:
+        entry = _status_cache['entry']
+        if entry and now - entry['cached_at'] < STATUS_CACHE_TTL_SECONDS:
+            age = now - entry['cached_at']
+            _status_cache_stats['hits'] += 1
+            _status_cache_stats['max_served_age_seconds'] = max(_status_cache_stats['max_served_age_seconds'], age)
+            return entry, _status_cache['generation']
+        _status_cache_stats['misses'] += 1
+        return None, _status_cache['generation']
+
+def store_cached_status(body: str, generation: int) -> Dict[str, Any]:
+    '''Кладет статус в кеш, если с начала чтения не было инвалидации'''
+    entry = {
+        'body': body,
+        'etag': make_etag(body),
+        'cached_at': time.monotonic()
+    }
+    with _status_cache_lock:
+        if STATUS_CACHE_TTL_SECONDS > 0 and _status_cache['generation'] == generation:
+            _status_cache['entry'] = entry
+    return entry
+
+def invalidate_status_cache() -> None:
+    '''Сбрасывает кеш статуса после коммита, меняющего данные лотереи'''
+    with _status_cache_lock:
+        _status_cache['generation'] += 1
+        _status_cache['entry'] = None
+        _status_cache_stats['invalidations'] += 1
+
+def get_status_cache_stats() -> Dict[str, Any]:
+    '''Возвращает долю попаданий и устарелость кеша статуса'''
+    now = time.monotonic()
+    with _status_cache_lock:
+        stats = dict(_status_cache_stats)
+        entry = _status_cache['entry']
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    stats['entry_age_seconds'] = round(now - entry['cached_at'], 3) if entry else None
+    stats['max_served_age_seconds'] = round(stats['max_served_age_seconds'], 3)
+    stats['ttl_seconds'] = STATUS_CACHE_TTL_SECONDS
+    return stats
+
+def build_status_response(event: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    '''Формирует ответ статуса, который клиенты перепроверяют по ETag'''
+    response = build_cached_response(event, entry, 'no-cache')
+    if response['statusCode'] == 304:
+        with _status_cache_lock:
+            _status_cache_stats['not_modified'] += 1
+    return response
+
+def build_cached_response(event: Dict[str, Any], entry: Dict[str, Any], cache_control: str) -> Dict[str, Any]:
+    '''Формирует ответ с ETag, отвечая 304 на совпавший If-None-Match'''
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': cache_control,
+        'ETag': entry['etag']
+    }
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    if_none_match = request_headers.get('if-none-match', '')
+    
+    if entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    
+    return {'statusCode': 200, 'headers': headers, 'body': entry['body']}
+
+def make_etag(body: str) -> str:
+    '''Строит стабильный ETag из тела ответа'''
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def get_immutable_round_key(params: Dict[str, Any]) -> Optional[str]:
+    '''Ключ кеша для запроса конкретного раунда; активный раунд (round=0) не кешируется'''
+    action = params.get('action')
+    if action not in ('winners', 'participants'):
+        return None
+    try:
+        round_num = int(params.get('round', '0'))
+    except ValueError:
+        return None
+    if round_num <= 0:
+        return None
+    if action == 'participants':
+        return f"participants:{round_num}:{params.get('limit', '')}:{params.get('after', '')}"
+    return f'winners:{round_num}'
+
+def is_round_completed(cursor, round_num: int) -> bool:
+    '''Проверяет, что розыгрыш раунда проведен и его данные больше не меняются'''
+    cursor.execute("""
+        SELECT is_active FROM lottery 
+        WHERE current_round = %s 
+        ORDER BY id DESC 
+        LIMIT 1
+    """, (round_num,))
+    lottery = cursor.fetchone()
+    return lottery is not None and not lottery['is_active']
+
+def get_immutable_round_entry(key: str) -> Optional[Dict[str, Any]]:
+    '''Возвращает ответ завершенного раунда из кеша'''
+    with _immutable_cache_lock:
+        entry = _immutable_cache.get(key)
+        if entry:
+            _immutable_cache.move_to_end(key)
+            _immutable_cache_stats['hits'] += 1
+        else:
+            _immutable_cache_stats['misses'] += 1
+        return entry
+
+def store_immutable_round_entry(key: str, body: str) -> Dict[str, Any]:
+    '''Кладет ответ завершенного раунда в кеш, вытесняя самые давние записи сверх лимита'''
+    entry = {'body': body, 'etag': make_etag(body), 'cached_at': time.monotonic()}
+    with _immutable_cache_lock:
+        _immutable_cache[key] = entry
+        _immutable_cache.move_to_end(key)
+        while len(_immutable_cache) > IMMUTABLE_CACHE_MAX_ENTRIES:
+            _immutable_cache.popitem(last=False)
+            _immutable_cache_stats['evictions'] += 1
+    return entry
+
+def build_immutable_response(event: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    '''Формирует ответ завершенного раунда, который CDN и браузеры могут хранить бессрочно'''
+    response = build_cached_response(event, entry, IMMUTABLE_CACHE_CONTROL)
+    if response['statusCode'] == 304:
+        with _immutable_cache_lock:
+            _immutable_cache_stats['not_modified'] += 1
+    return response
+
+def get_immutable_cache_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики кеша завершенных раундов'''
+    with _immutable_cache_lock:
+        stats = dict(_immutable_cache_stats)
+        stats['entries'] = len(_immutable_cache)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    stats['max_entries'] = IMMUTABLE_CACHE_MAX_ENTRIES
+    return stats
+
+def calculate_prize_funds(total_amount: int) -> Tuple[int, int, int]:
+    '''Считает призовые фонды (10%, 3%, 1%) от суммы инвестиций в центах'''
+    return int(total_amount * 0.10), int(total_amount * 0.03), int(total_amount * 0.01)
+
 def add_lottery_participant(cursor, conn, data):
     '''Добавляет участника в лотерею при инвестиции'''
+    result = register_lottery_participant(cursor, data)
+    conn.commit()
+    invalidate_status_cache()
+    return result
+
+def register_lottery_participant(cursor, data):
+    '''Регистрирует участника в текущей транзакции вызывающего без commit'''
     payment_id = data.get('payment_id')
     investment_amount = data.get('amount', 0)
     participant_email = data.get('email')
@@ -211,25 +529,16 @@ def add_lottery_participant(cursor, conn, data):
         raise ValueError("Payment ID is required")
     
     # Get current lottery round
-    cursor.execute("""
-        SELECT current_round FROM lottery 
-        WHERE is_active = true 
-        ORDER BY current_round DESC 
-        LIMIT 1
-    """)
-    
-    lottery = cursor.fetchone()
-    current_round = lottery['current_round'] if lottery else 1
+    current_round = lock_active_round(cursor)
     
     # Generate lottery tickets (1 ticket per $10 invested)
     num_tickets = max(1, investment_amount // 1000)  # 1000 cents = $10
-    ticket_numbers = generate_ticket_numbers(num_tickets)
     
     # Add participant
     cursor.execute("""
         INSERT INTO lottery_participants (
             payment_id, lottery_round, participant_email, 
-            investment_amount, ticket_numbers
+            investment_amount, tickets_count
         ) VALUES (%s, %s, %s, %s, %s)
         RETURNING id
     """, (
@@ -237,11 +546,11 @@ def add_lottery_participant(cursor, conn, data):
         current_round,
         participant_email,
         investment_amount,
-        ','.join(ticket_numbers)
+        num_tickets
     ))
     
     participant_id = cursor.fetchone()['id']
-    conn.commit()
+    ticket_numbers = insert_lottery_tickets(cursor, current_round, {participant_id: num_tickets})[participant_id]
     
     return {
         'success': True,
@@ -252,19 +561,206 @@ def add_lottery_participant(cursor, conn, data):
         'message': f'Участник добавлен в лотерею раунда {current_round} с {num_tickets} билетами'
     }
 
-def generate_ticket_numbers(count: int) -> List[str]:
-    '''Генерирует уникальные номера билетов'''
+def is_plain_int(value) -> bool:
+    '''Проверяет, что значение из JSON - целое число, а не bool'''
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def validate_participant_item(item) -> Optional[str]:
+    '''Проверяет платеж из пакета регистрации; возвращает текст ошибки или None'''
+    if not isinstance(item, dict):
+        return 'Payment must be an object'
+    if not item.get('payment_id'):
+        return 'Payment ID is required'
+    if not is_plain_int(item['payment_id']) or item['payment_id'] < 0:
+        return 'Payment ID must be a positive integer'
+    amount = item.get('amount', 0)
+    if not is_plain_int(amount) or amount < 0:
+        return 'Amount must be a non-negative integer in cents'
+    if item.get('email') is not None and not isinstance(item['email'], str):
+        return 'Email must be a string'
+    return None
+
+def add_lottery_participants(cursor, conn, data):
+    '''Пакетно добавляет участников в лотерею одной транзакцией'''
+    payments = data.get('payments')
+    if not isinstance(payments, list) or not payments:
+        raise ValueError("Payments array is required")
+    if len(payments) > MAX_BATCH_PARTICIPANTS:
+        raise ValueError(f"Batch is limited to {MAX_BATCH_PARTICIPANTS} payments")
+    
+    # Resolve the current round once for the whole batch
+    current_round = lock_active_round(cursor)
+    
+    # Each item is checked on its own so one malformed payment is reported instead of failing the batch
+    errors = [validate_participant_item(item) for item in payments]
+    payment_ids = [item['payment_id'] for item, error in zip(payments, errors) if error is None]
+    cursor.execute("""
+        SELECT payment_id, id FROM lottery_participants
+        WHERE payment_id = ANY(%s)
+    """, (payment_ids,))
+    registered = {row['payment_id']: row['id'] for row in cursor.fetchall()}
+    
+    results = []
+    new_participants = []
+    seen_payment_ids = set()
+    for item, error in zip(payments, errors):
+        if error is not None:
+            payment_id = item.get('payment_id') if isinstance(item, dict) else None
+            results.append({
+                'payment_id': payment_id if is_plain_int(payment_id) else None,
+                'status': 'invalid',
+                'error': error
+            })
+            continue
+        payment_id = item['payment_id']
+        if payment_id in registered or payment_id in seen_payment_ids:
+            results.append({
+                'payment_id': payment_id,
+                'status': 'duplicate',
+                'participant_id': registered.get(payment_id)
+            })
+        else:
+            seen_payment_ids.add(payment_id)
+            investment_amount = item.get('amount', 0)
+            num_tickets = max(1, investment_amount // 1000)  # 1000 cents = $10
+            new_participants.append((
+                payment_id,
+                current_round,
+                item.get('email'),
+                investment_amount,
+                num_tickets
+            ))
+            results.append({'payment_id': payment_id, 'status': 'added', 'tickets_count': num_tickets})
+    
+    participant_ids = {}
+    ticket_numbers = {}
+    if new_participants:
+        inserted = psycopg2.extras.execute_values(cursor, """
+            INSERT INTO lottery_participants (
+                payment_id, lottery_round, participant_email, 
+                investment_amount, tickets_count
+            ) VALUES %s
+            RETURNING id, payment_id, tickets_count
+        """, new_participants, page_size=1000, fetch=True)
+        participant_ids = {row['payment_id']: row['id'] for row in inserted}
+        ticket_numbers = insert_lottery_tickets(
+            cursor,
+            current_round,
+            {row['id']: row['tickets_count'] for row in inserted}
+        )
+    
+    conn.commit()
+    invalidate_status_cache()
+    
+    for result in results:
+        if result['status'] == 'added':
+            result['participant_id'] = participant_ids[result['payment_id']]
+            result['ticket_numbers'] = ticket_numbers[result['participant_id']]
+        elif result['status'] == 'duplicate' and result['participant_id'] is None:
+            # Repeated within this batch: point at the participant created for its first occurrence
+            result['participant_id'] = participant_ids.get(result['payment_id'])
+    
+    added_count = len(new_participants)
+    return {
+        'success': True,
+        'lottery_round': current_round,
+        'added': added_count,
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+        'results': results,
+        'message': f'В лотерею раунда {current_round} добавлено участников: {added_count}'
+    }
+
+def generate_ticket_numbers(round_num: int, positions: Iterable[int]) -> List[str]:
+    '''Генерирует номера билетов для позиций последовательности раунда'''
+    tables = get_ticket_permutation_tables(round_num)
+    letters = _TICKET_LETTERS
+    digits = _TICKET_DIGITS
     tickets = []
-    for _ in range(count):
-        # Generate ticket like "LT-ABC123"
-        letters = ''.join(random.choices(string.ascii_uppercase, k=3))
-        numbers = ''.join(random.choices(string.digits, k=3))
-        ticket = f"LT-{letters}{numbers}"
-        tickets.append(ticket)
+    for position in positions:
+        if not 0 <= position < TICKET_SPACE:
+            raise ValueError("Ticket number space exhausted for this round")
+        # Alternating keyed additions over (letters, digits) form a bijection on the code space
+        left, right = divmod(position, TICKET_DIGIT_SPACE)
+        for left_table, right_table in tables:
+            left = (left + left_table[right]) % TICKET_LETTER_SPACE
+            right = (right + right_table[left]) % TICKET_DIGIT_SPACE
+        tickets.append(f"LT-{letters[left]}{digits[right]}")
     return tickets
 
-def get_lottery_participants(cursor, round_num=0):
-    '''Получает список участников лотереи'''
+@functools.lru_cache(maxsize=8)
+def get_ticket_permutation_tables(round_num: int) -> Tuple[Tuple[List[int], List[int]], ...]:
+    '''Строит таблицы перестановки номеров билетов из ключа и номера раунда'''
+    seed = hashlib.sha256(f'{LOTTERY_TICKET_KEY}:{round_num}'.encode('utf-8')).digest()
+    rng = random.Random(seed)
+    return tuple(
+        (
+            [rng.randrange(TICKET_LETTER_SPACE) for _ in range(TICKET_DIGIT_SPACE)],
+            [rng.randrange(TICKET_DIGIT_SPACE) for _ in range(TICKET_LETTER_SPACE)]
+        )
+        for _ in range(TICKET_PERMUTATION_ROUNDS)
+    )
+
+def allocate_ticket_positions(cursor, round_num: int, count: int) -> List[int]:
+    '''Выдает count позиций из последовательности раунда одним запросом'''
+    # nextval never waits for other transactions, unlike a counter column on the lottery row.
+    # A round past the prepared horizon falls back to the shared sequence; collisions are reissued.
+    cursor.execute("""
+        SELECT nextval(COALESCE(to_regclass(%s), 'lottery_tickets_default_seq'::regclass)) AS position
+        FROM generate_series(1, %s)
+    """, (f'lottery_tickets_r{round_num}_seq', count))
+    return [row['position'] for row in cursor.fetchall()]
+
+def lock_active_round(cursor) -> int:
+    '''Возвращает активный раунд, не давая его разыграть до конца транзакции'''
+    # KEY SHARE locks do not conflict with each other, only with the draw's FOR UPDATE.
+    # A registration that waited for a draw finds the closed round skipped and reads again.
+    for _ in range(2):
+        cursor.execute("""
+            SELECT current_round FROM lottery 
+            WHERE is_active = true 
+            ORDER BY current_round DESC 
+            LIMIT 1
+            FOR KEY SHARE
+        """)
+        lottery = cursor.fetchone()
+        if lottery:
+            return lottery['current_round']
+    return 1
+
+def insert_lottery_tickets(cursor, round_num: int, ticket_counts: Dict[int, int]) -> Dict[int, List[str]]:
+    '''Сохраняет билеты участников; номера, занятые старыми случайными билетами, выдаются заново'''
+    tickets: Dict[int, List[str]] = {participant_id: [] for participant_id in ticket_counts}
+    missing = dict(ticket_counts)
+    while missing:
+        total = sum(missing.values())
+        positions = allocate_ticket_positions(cursor, round_num, total)
+        numbers = iter(generate_ticket_numbers(round_num, positions))
+        rows = [
+            (round_num, next(numbers), participant_id)
+            for participant_id, count in missing.items()
+            for _ in range(count)
+        ]
+        inserted = psycopg2.extras.execute_values(cursor, """
+            INSERT INTO lottery_tickets (lottery_round, ticket_number, participant_id)
+            VALUES %s
+            ON CONFLICT (lottery_round, ticket_number) DO NOTHING
+            RETURNING participant_id, ticket_number
+        """, rows, page_size=1000, fetch=True)
+        for row in inserted:
+            tickets[row['participant_id']].append(row['ticket_number'])
+        missing = {
+            participant_id: count - len(tickets[participant_id])
+            for participant_id, count in ticket_counts.items()
+            if len(tickets[participant_id]) < count
+        }
+    return tickets
+
+def get_ticket_owner(cursor, round_num, ticket_number):
+    '''Находит владельца билета по индексу (раунд, номер билета)'''
+    if not ticket_number:
+        raise ValueError("Ticket number is required")
+    
     if round_num == 0:
         cursor.execute("""
             SELECT current_round FROM lottery 
@@ -277,35 +773,235 @@ def get_lottery_participants(cursor, round_num=0):
     
     cursor.execute("""
         SELECT 
-            lp.id, lp.participant_email, lp.investment_amount,
-            lp.ticket_numbers, lp.created_at,
-            p.payment_intent_id
-        FROM lottery_participants lp
-        JOIN payments p ON lp.payment_id = p.id
-        WHERE lp.lottery_round = %s
-        ORDER BY lp.created_at DESC
-    """, (round_num,))
+            lt.ticket_number, lp.id, lp.participant_email,
+            lp.investment_amount, lp.tickets_count
+        FROM lottery_tickets lt
+        JOIN lottery_participants lp 
+            ON lt.participant_id = lp.id AND lp.lottery_round = lt.lottery_round
+        WHERE lt.lottery_round = %s AND lt.ticket_number = %s
+    """, (round_num, ticket_number))
     
-    participants = cursor.fetchall()
-    
-    participants_list = []
-    for p in participants:
-        participants_list.append({
-            'id': p['id'],
-            'email': p['participant_email'],
-            'investment_usd': p['investment_amount'] / 100,
-            'ticket_numbers': p['ticket_numbers'].split(',') if p['ticket_numbers'] else [],
-            'tickets_count': len(p['ticket_numbers'].split(',')) if p['ticket_numbers'] else 0,
-            'payment_id': p['payment_intent_id'],
-            'joined_at': p['created_at'].isoformat() if p['created_at'] else None
-        })
+    owner = cursor.fetchone()
     
     return {
         'round': round_num,
-        'participants': participants_list,
-        'total_participants': len(participants_list)
+        'ticket_number': ticket_number,
+        'found': owner is not None,
+        'participant': {
+            'id': owner['id'],
+            'email': owner['participant_email'],
+            'investment_usd': owner['investment_amount'] / 100,
+            'tickets_count': owner['tickets_count']
+        } if owner else None
+    }
+
+def get_lottery_participants(cursor, conn, round_num=0, limit=PARTICIPANTS_PAGE_SIZE, after=None) -> str:
+    '''Получает страницу участников лотереи и сериализует ее построчно'''
+    if round_num == 0:
+        cursor.execute("""
+            SELECT current_round FROM lottery 
+            WHERE is_active = true 
+            ORDER BY current_round DESC 
+            LIMIT 1
+        """)
+        result = cursor.fetchone()
+        round_num = result['current_round'] if result else 1
+    
+    keyset_filter = ''
+    query_params: List[Any] = [round_num]
+    if after:
+        after_created_at, after_id = decode_participants_cursor(after)
+        keyset_filter = 'AND (lp.created_at, lp.id) < (%s, %s)'
+        query_params.extend([after_created_at, after_id])
+    query_params.append(limit + 1)
+    
+    chunks = [f'{{"round": {json.dumps(round_num)}, "participants": [']
+    count = 0
+    has_more = False
+    last_row = None
+    
+    # Named cursor keeps rows on the server and streams them in PARTICIPANTS_FETCH_SIZE batches
+    with conn.cursor(name='lottery_participants_page', cursor_factory=psycopg2.extras.RealDictCursor) as page_cursor:
+        page_cursor.itersize = PARTICIPANTS_FETCH_SIZE
+        page_cursor.execute(f"""
+            SELECT 
+                lp.id, lp.participant_email, lp.investment_amount,
+                lp.tickets_count, lp.created_at,
+                ARRAY(
+                    SELECT lt.ticket_number FROM lottery_tickets lt
+                    WHERE lt.participant_id = lp.id
+                    ORDER BY lt.id
+                ) AS ticket_numbers,
+                p.payment_intent_id
+            FROM lottery_participants lp
+            JOIN payments p ON lp.payment_id = p.id
+            WHERE lp.lottery_round = %s
+            {keyset_filter}
+            ORDER BY lp.created_at DESC, lp.id DESC
+            LIMIT %s
+        """, query_params)
+        
+        for p in page_cursor:
+            if count == limit:
+                has_more = True
+                break
+            if count:
+                chunks.append(', ')
+            chunks.append(json.dumps({
+                'id': p['id'],
+                'email': p['participant_email'],
+                'investment_usd': p['investment_amount'] / 100,
+                'ticket_numbers': p['ticket_numbers'],
+                'tickets_count': p['tickets_count'],
+                'payment_id': p['payment_intent_id'],
+                'joined_at': p['created_at'].isoformat() if p['created_at'] else None
+            }))
+            count += 1
+            last_row = p
+    
+    next_cursor = encode_participants_cursor(last_row['created_at'], last_row['id']) if has_more else None
+    chunks.append(f'], "count": {count}, "limit": {limit}, "has_more": {json.dumps(has_more)}, "next_cursor": {json.dumps(next_cursor)}}}')
+    return ''.join(chunks)
+
+def encode_participants_cursor(created_at: datetime, participant_id: int) -> str:
+    '''Кодирует позицию (created_at, id) в непрозрачный курсор'''
+    raw = f'{created_at.isoformat()}|{participant_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_participants_cursor(cursor_value: str) -> Tuple[datetime, int]:
+    '''Разбирает курсор, выданный encode_participants_cursor'''
+    try:
+        padded = cursor_value + '=' * (-len(cursor_value) % 4)
+        created_at, participant_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(participant_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid participants cursor")
+
+def export_round_response(cursor, conn, params):
+    '''Выгружает участников и билеты раунда в NDJSON или CSV, при необходимости сжимая gzip'''
+    export_format = params.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid export format'})
+        }
+    compress = params.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+    limit = max(1, min(int(params.get('limit', str(EXPORT_PAGE_ROWS))), EXPORT_PAGE_ROWS))
+    after = params.get('after')
+    
+    round_num = int(params.get('round', '0'))
+    if round_num == 0:
+        cursor.execute("""
+            SELECT current_round FROM lottery 
+            WHERE is_active = true 
+            ORDER BY current_round DESC 
+            LIMIT 1
+        """)
+        result = cursor.fetchone()
+        round_num = result['current_round'] if result else 1
+    
+    # The response body is buffered, so it is capped at one page; memory does not grow with the round.
+    # Pages are appended in order: CSV repeats no header and gzip members concatenate into one file.
+    buffer = io.BytesIO()
+    sink = gzip.GzipFile(fileobj=buffer, mode='wb') if compress else buffer
+    rows_count, next_cursor = write_round_export(conn, round_num, export_format, sink, limit, after)
+    if compress:
+        sink.close()
+    
+    filename = f'lottery_round_{round_num}.{export_format}' + ('.gz' if compress else '')
+    content_type = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv; charset=utf-8'
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/gzip' if compress else content_type,
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Export-Rows': str(rows_count),
+            'X-Next-Cursor': next_cursor or '',
+            'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Rows, X-Next-Cursor',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': compress,
+        'body': base64.b64encode(buffer.getvalue()).decode('ascii') if compress else buffer.getvalue().decode('utf-8')
     }
 
+def write_round_export(conn, round_num: int, export_format: str, sink,
+                       limit: Optional[int] = None, after: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    '''Пишет до limit участников раунда после курсора after в бинарный поток, держа в памяти одну пачку строк'''
+    keyset_filter = ''
+    query_params: List[Any] = [round_num]
+    if after:
+        after_created_at, after_id = decode_participants_cursor(after)
+        keyset_filter = 'AND (lp.created_at, lp.id) < (%s, %s)'
+        query_params.extend([after_created_at, after_id])
+    limit_clause = ''
+    if limit is not None:
+        # One extra row tells whether another page follows
+        limit_clause = 'LIMIT %s'
+        query_params.append(limit + 1)
+    
+    text_sink = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    csv_writer = None
+    if export_format == 'csv':
+        csv_writer = csv.writer(text_sink)
+        if not after:
+            csv_writer.writerow(EXPORT_CSV_COLUMNS)
+    
+    rows_count = 0
+    last_row = None
+    has_more = False
+    with conn.cursor(name='lottery_round_export') as export_cursor:
+        export_cursor.itersize = EXPORT_BATCH_SIZE
+        export_cursor.execute(f"""
+            SELECT 
+                lp.id, lp.payment_id, p.payment_intent_id, lp.participant_email,
+                lp.investment_amount, lp.tickets_count,
+                ARRAY(
+                    SELECT lt.ticket_number FROM lottery_tickets lt
+                    WHERE lt.participant_id = lp.id
+                    ORDER BY lt.id
+                ) AS ticket_numbers,
+                lp.created_at
+            FROM lottery_participants lp
+            JOIN payments p ON lp.payment_id = p.id
+            WHERE lp.lottery_round = %s
+            {keyset_filter}
+            ORDER BY lp.created_at DESC, lp.id DESC
+            {limit_clause}
+        """, query_params)
+        
+        while not has_more:
+            batch = export_cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            if limit is not None and rows_count + len(batch) > limit:
+                batch = batch[:limit - rows_count]
+                has_more = True
+            for row in batch:
+                joined_at = row[7].isoformat() if row[7] else None
+                if csv_writer:
+                    csv_writer.writerow([row[0], row[1], row[2], row[3], row[4], row[5], ' '.join(row[6]), joined_at])
+                else:
+                    text_sink.write(json.dumps({
+                        'participant_id': row[0],
+                        'payment_id': row[1],
+                        'payment_intent_id': row[2],
+                        'email': row[3],
+                        'investment_amount': row[4],
+                        'tickets_count': row[5],
+                        'ticket_numbers': row[6],
+                        'joined_at': joined_at
+                    }) + '\n')
+            rows_count += len(batch)
+            if batch:
+                last_row = batch[-1]
+    
+    # Detach so closing the wrapper later does not close the caller's sink
+    text_sink.detach()
+    next_cursor = encode_participants_cursor(last_row[7], last_row[0]) if has_more else None
+    return rows_count, next_cursor
+
 def get_lottery_winners(cursor, round_num=0):
     '''Получает список победителей лотереи'''
     if round_num == 0:
@@ -324,7 +1020,8 @@ def get_lottery_winners(cursor, round_num=0):
             lw.claimed, lw.created_at,
             lp.participant_email, lp.investment_amount
         FROM lottery_winners lw
-        JOIN lottery_participants lp ON lw.participant_id = lp.id
+        JOIN lottery_participants lp 
+            ON lw.participant_id = lp.id AND lp.lottery_round = lw.lottery_round
         WHERE lw.lottery_round = %s
         ORDER BY lw.prize_position ASC
     """, (round_num,))
@@ -349,17 +1046,92 @@ def get_lottery_winners(cursor, round_num=0):
         'total_winners': len(winners_list)
     }
 
+def get_lottery_history(cursor, params):
+    '''Получает победителей и итоги нескольких завершенных раундов одним запросом'''
+    if params.get('from_round') or params.get('to_round'):
+        from_round = int(params.get('from_round', '1'))
+        to_round = int(params.get('to_round', str(2 ** 31 - 1)))
+        rounds_limit = HISTORY_MAX_ROUNDS
+    else:
+        from_round, to_round = 1, 2 ** 31 - 1
+        rounds_limit = max(1, min(int(params.get('last', str(HISTORY_DEFAULT_ROUNDS))), HISTORY_MAX_ROUNDS))
+    
+    # One extra round tells the client that older rounds remain beyond the cap
+    cursor.execute("""
+        WITH rounds AS (
+            SELECT 
+                current_round, draw_date, total_investment_amount,
+                prize_fund_1, prize_fund_2, prize_fund_3,
+                round_participants, round_tickets
+            FROM lottery 
+            WHERE is_active = false 
+            AND current_round BETWEEN %s AND %s
+            ORDER BY current_round DESC 
+            LIMIT %s
+        )
+        SELECT 
+            r.current_round, r.draw_date, r.total_investment_amount,
+            r.prize_fund_1 + r.prize_fund_2 + r.prize_fund_3 AS prize_fund,
+            r.round_participants, r.round_tickets,
+            lw.prize_position, lw.prize_amount, lw.winning_ticket, lw.claimed,
+            lp.participant_email, lp.investment_amount
+        FROM rounds r
+        LEFT JOIN lottery_winners lw ON lw.lottery_round = r.current_round
+        LEFT JOIN lottery_participants lp 
+            ON lw.participant_id = lp.id AND lp.lottery_round = lw.lottery_round
+        ORDER BY r.current_round DESC, lw.prize_position ASC
+    """, (from_round, to_round, rounds_limit + 1))
+    
+    rounds_list = []
+    for row in cursor.fetchall():
+        if not rounds_list or rounds_list[-1]['round'] != row['current_round']:
+            rounds_list.append({
+                'round': row['current_round'],
+                'drawn_at': row['draw_date'].isoformat() if row['draw_date'] else None,
+                'total_investment_usd': row['total_investment_amount'] / 100,
+                'total_participants': row['round_participants'],
+                'total_tickets': row['round_tickets'],
+                'prize_fund_usd': row['prize_fund'] / 100,
+                'prizes_awarded_usd': 0,
+                'winners': []
+            })
+            prizes_awarded = 0
+        if row['prize_position'] is not None:
+            round_entry = rounds_list[-1]
+            prizes_awarded += row['prize_amount']
+            round_entry['prizes_awarded_usd'] = prizes_awarded / 100
+            round_entry['winners'].append({
+                'position': row['prize_position'],
+                'prize_usd': row['prize_amount'] / 100,
+                'winning_ticket': row['winning_ticket'],
+                'winner_email': row['participant_email'],
+                'investment_usd': row['investment_amount'] / 100 if row['investment_amount'] is not None else None,
+                'claimed': row['claimed']
+            })
+    
+    has_more = len(rounds_list) > rounds_limit
+    if has_more:
+        rounds_list.pop()
+    
+    return {
+        'rounds': rounds_list,
+        'total_rounds': len(rounds_list),
+        'max_rounds': HISTORY_MAX_ROUNDS,
+        'has_more': has_more,
+        'next_to_round': rounds_list[-1]['round'] - 1 if has_more else None
+    }
+
 def conduct_lottery_draw(cursor, conn, data):
     '''Проводит розыгрыш лотереи'''
     try:
         # Get current lottery round
         cursor.execute("""
-            SELECT id, current_round, total_investment_amount, 
-                   prize_fund_1, prize_fund_2, prize_fund_3
+            SELECT id, current_round
             FROM lottery 
             WHERE is_active = true 
             ORDER BY current_round DESC 
             LIMIT 1
+            FOR UPDATE
         """)
         
         lottery = cursor.fetchone()
@@ -368,6 +1140,17 @@ def conduct_lottery_draw(cursor, conn, data):
         
         current_round = lottery['current_round']
         
+        # Snapshot the prize fund from the running totals
+        cursor.execute("""
+            SELECT total_investment_amount, total_investors
+            FROM lottery_fund_totals
+            WHERE id = 1
+        """)
+        
+        fund = cursor.fetchone()
+        total_amount = fund['total_investment_amount'] if fund else 0
+        prize_1, prize_2, prize_3 = calculate_prize_funds(total_amount)
+        
         # Check if draw already conducted
         cursor.execute("""
             SELECT COUNT(*) as winner_count
@@ -379,56 +1162,53 @@ def conduct_lottery_draw(cursor, conn, data):
         if existing_winners['winner_count'] > 0:
             raise ValueError("Draw already conducted for this round")
         
-        # Get all participants for current round
+        # Load per-participant ticket counts: memory grows with participants, not tickets
         cursor.execute("""
-            SELECT id, participant_email, investment_amount, ticket_numbers
+            SELECT id, tickets_count
             FROM lottery_participants 
-            WHERE lottery_round = %s
+            WHERE lottery_round = %s AND tickets_count > 0
             ORDER BY id
         """, (current_round,))
         
-        participants = cursor.fetchall()
-        if not participants:
-            raise ValueError("No participants found for this round")
-        
-        # Collect all tickets
-        all_tickets = []
-        ticket_to_participant = {}
-        
-        for participant in participants:
-            if participant['ticket_numbers']:
-                tickets = participant['ticket_numbers'].split(',')
-                for ticket in tickets:
-                    ticket = ticket.strip()
-                    all_tickets.append(ticket)
-                    ticket_to_participant[ticket] = participant
+        participant_ids = []
+        ticket_counts = []
+        for row in cursor:
+            participant_ids.append(row['id'])
+            ticket_counts.append(row['tickets_count'])
         
-        if len(all_tickets) == 0:
+        total_tickets = sum(ticket_counts)
+        if total_tickets == 0:
             raise ValueError("No tickets found for drawing")
         
         # Conduct draw for 3 prizes
         winners = []
-        used_tickets = set()
         
         prizes = [
-            {'position': 1, 'amount': lottery['prize_fund_1']},
-            {'position': 2, 'amount': lottery['prize_fund_2']},
-            {'position': 3, 'amount': lottery['prize_fund_3']}
+            {'position': 1, 'amount': prize_1},
+            {'position': 2, 'amount': prize_2},
+            {'position': 3, 'amount': prize_3}
         ]
         
-        for prize in prizes:
-            # Get available tickets (not yet used)
-            available_tickets = [t for t in all_tickets if t not in used_tickets]
-            if not available_tickets:
-                break
-            
-            # Select random winning ticket
-            import secrets
-            winning_ticket = secrets.choice(available_tickets)
-            used_tickets.add(winning_ticket)
+        picks = draw_weighted_winners(ticket_counts, len(prizes))
+        
+        for prize, (index, ticket_offset) in zip(prizes, picks):
+            # Resolve the drawn ticket inside the winner's own tickets
+            cursor.execute("""
+                SELECT 
+                    lp.id, lp.participant_email, lp.investment_amount, lt.ticket_number
+                FROM lottery_participants lp
+                JOIN LATERAL (
+                    SELECT ticket_number FROM lottery_tickets
+                    WHERE participant_id = lp.id
+                    ORDER BY id
+                    OFFSET %s
+                    LIMIT 1
+                ) lt ON true
+                WHERE lp.id = %s AND lp.lottery_round = %s
+            """, (ticket_offset, participant_ids[index], current_round))
             
-            # Find participant who owns the winning ticket
-            winner_participant = ticket_to_participant[winning_ticket]
+            winner_participant = cursor.fetchone()
+            winning_ticket = winner_participant['ticket_number']
             
             # Insert winner record
             cursor.execute("""
@@ -461,13 +1241,29 @@ def conduct_lottery_draw(cursor, conn, data):
         cursor.execute("""
             UPDATE lottery 
             SET 
+                total_investment_amount = %s,
+                prize_fund_1 = %s,
+                prize_fund_2 = %s,
+                prize_fund_3 = %s,
+                total_participants = %s,
+                round_participants = %s,
+                round_tickets = %s,
                 draw_date = CURRENT_TIMESTAMP,
                 is_active = false,
                 updated_at = CURRENT_TIMESTAMP
             WHERE id = %s
-        """, (lottery['id'],))
+        """, (
+            total_amount,
+            prize_1,
+            prize_2,
+            prize_3,
+            fund['total_investors'] if fund else 0,
+            len(participant_ids),
+            total_tickets,
+            lottery['id']
+        ))
         
-        # Create new lottery round for future
+        # Create new lottery round for future; its partitions are prepared ahead by prepare_lottery_rounds()
         cursor.execute("""
             INSERT INTO lottery (
                 total_investment_amount, prize_fund_1, prize_fund_2, prize_fund_3,
@@ -476,13 +1272,14 @@ def conduct_lottery_draw(cursor, conn, data):
         """, (current_round + 1,))
         
         conn.commit()
+        invalidate_status_cache()
         
         return {
             'success': True,
             'round': current_round,
             'winners': winners,
-            'total_participants': len(participants),
-            'total_tickets': len(all_tickets),
+            'total_participants': len(participant_ids),
+            'total_tickets': total_tickets,
             'message': f'Розыгрыш раунда {current_round} успешно проведен! Выбрано {len(winners)} победителей.'
         }
         
@@ -490,6 +1287,56 @@ def conduct_lottery_draw(cursor, conn, data):
         conn.rollback()
         raise Exception(f"Error conducting lottery draw: {str(e)}")
 
+def draw_weighted_winners(ticket_counts: List[int], prize_count: int) -> List[Tuple[int, int]]:
+    '''Выбирает победителей пропорционально числу билетов, каждый участник выигрывает один раз'''
+    tree = build_fenwick_tree(ticket_counts)
+    remaining_tickets = sum(ticket_counts)
+    picks = []
+    
+    for _ in range(prize_count):
+        if remaining_tickets <= 0:
+            break
+        
+        # A uniformly drawn ticket maps to its owner and the ticket's offset among their tickets
+        index, ticket_offset = find_fenwick_index(tree, secrets.randbelow(remaining_tickets))
+        picks.append((index, ticket_offset))
+        
+        # Remove the winner's weight so later tiers never pick them again
+        add_fenwick_delta(tree, index, -ticket_counts[index])
+        remaining_tickets -= ticket_counts[index]
+    
+    return picks
+
+def build_fenwick_tree(counts: List[int]) -> List[int]:
+    '''Строит дерево Фенвика над количеством билетов за O(n)'''
+    tree = [0] + list(counts)
+    size = len(tree)
+    for i in range(1, size):
+        parent = i + (i & -i)
+        if parent < size:
+            tree[parent] += tree[i]
+    return tree
+
+def add_fenwick_delta(tree: List[int], index: int, delta: int) -> None:
+    '''Изменяет вес элемента с индексом index (с нуля)'''
+    i = index + 1
+    while i < len(tree):
+        tree[i] += delta
+        i += i & -i
+
+def find_fenwick_index(tree: List[int], target: int) -> Tuple[int, int]:
+    '''Находит элемент, в чей диапазон попадает target, и смещение внутри него'''
+    position = 0
+    remaining = target
+    step = 1 << (len(tree) - 1).bit_length()
+    while step:
+        next_position = position + step
+        if next_position < len(tree) and tree[next_position] <= remaining:
+            position = next_position
+            remaining -= tree[next_position]
+        step >>= 1
+    return position, remaining
+
 def update_prize_fund(cursor, conn, data):
     '''Обновляет призовой фонд (административная функция)'''
     # Admin function to manually update prize fund if needed
@@ -1,9 +1,18 @@
+import base64
+import hashlib
+import importlib.util
 import json
 import os
 import requests
 import psycopg2
 import psycopg2.extras
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, List, Tuple
 from pydantic import BaseModel, Field, ValidationError
 
 class PaymentRequest(BaseModel):
@@ -15,6 +24,167 @@ class PaymentRequest(BaseModel):
     customer_name: Optional[str] = Field(None, max_length=100)
     metadata: Optional[Dict[str, str]] = Field(default_factory=dict)
 
+# Upper bound for one campaign import batch
+MAX_BATCH_PAYMENTS = int(os.environ.get('MAX_BATCH_PAYMENTS', '500'))
+
+class PaymentBatchRequest(BaseModel):
+    payments: List[PaymentRequest] = Field(..., min_length=1, max_length=MAX_BATCH_PAYMENTS)
+    campaign: Optional[str] = Field(None, max_length=200)
+
+# Downstream functions; overridable so a local stub server can stand in for them
+LOTTERY_FUNCTION_URL = os.environ.get('LOTTERY_FUNCTION_URL', 'https://functions.poehali.dev/84895621-7397-4c97-a683-4c67fcfd0bad')
+EMAIL_FUNCTION_URL = os.environ.get('EMAIL_FUNCTION_URL', 'https://functions.poehali.dev/02a484b7-65f0-4f91-9812-ee40c53aff64')
+
+# Shared keep-alive HTTP session and fan-out pool for inter-function calls
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))
+HTTP_FANOUT_WORKERS = int(os.environ.get('HTTP_FANOUT_WORKERS', '4'))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('HTTP_TIMEOUT_SECONDS', '10'))
+
+_http_session: Optional[requests.Session] = None
+_http_executor: Optional[ThreadPoolExecutor] = None
+_http_lock = threading.Lock()
+_http_target_stats: Dict[str, Dict[str, Any]] = {}
+
+# Batch imports create Stripe intents concurrently, at most this many at a time
+STRIPE_BATCH_CONCURRENCY = int(os.environ.get('STRIPE_BATCH_CONCURRENCY', '8'))
+
+_stripe_executor: Optional[ThreadPoolExecutor] = None
+
+# Lottery registration mode: "inprocess" registers investors inside the payment transaction
+# when the lottery function code is deployed next to this one; otherwise the outbox calls it over HTTP
+LOTTERY_REGISTRATION_MODE = os.environ.get('LOTTERY_REGISTRATION_MODE', 'outbox')
+LOTTERY_MODULE_PATH = os.environ.get(
+    'LOTTERY_MODULE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lottery', 'index.py')
+)
+
+_lottery_module: Dict[str, Any] = {'loaded': False, 'module': None}
+_lottery_module_lock = threading.Lock()
+_lottery_registration_stats = {'inprocess': 0, 'fallback': 0}
+
+# Outbox drain: rows per run, retry limit and exponential backoff bounds
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get('OUTBOX_RETRY_BASE_SECONDS', '30'))
+OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get('OUTBOX_RETRY_MAX_SECONDS', '3600'))
+# Claimed rows are leased for this long; an invocation that dies mid-delivery is retried after it
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', '900'))
+
+# Idempotency-Key replays: recent keys are answered from memory, older ones from the lookup table
+IDEMPOTENCY_CACHE_TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_CACHE_TTL_SECONDS', '300'))
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_CACHE_MAX_ENTRIES', '1024'))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Keys expire with Stripe's own 24h idempotency window; the outbox drain purges expired rows
+IDEMPOTENCY_KEY_RETENTION_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_RETENTION_HOURS', '24'))
+IDEMPOTENCY_PURGE_BATCH_SIZE = int(os.environ.get('IDEMPOTENCY_PURGE_BATCH_SIZE', '1000'))
+
+_idempotency_cache: 'OrderedDict[str, Tuple[float, str, str]]' = OrderedDict()
+_idempotency_cache_lock = threading.Lock()
+_idempotency_stats = {'cache_hits': 0, 'db_hits': 0, 'misses': 0, 'conflicts': 0}
+
+# Stripe webhooks: payment_intent events are buffered and applied to payments in batches
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '500'))
+WEBHOOK_PENDING_TIMEOUT_SECONDS = int(os.environ.get('WEBHOOK_PENDING_TIMEOUT_SECONDS', '3600'))
+# Events for intents without a payments row are retried with exponential backoff until they expire
+WEBHOOK_RETRY_BASE_SECONDS = int(os.environ.get('WEBHOOK_RETRY_BASE_SECONDS', '30'))
+WEBHOOK_RETRY_MAX_SECONDS = int(os.environ.get('WEBHOOK_RETRY_MAX_SECONDS', '600'))
+WEBHOOK_EVENT_TYPES = {
+    'payment_intent.processing',
+    'payment_intent.requires_action',
+    'payment_intent.succeeded',
+    'payment_intent.payment_failed',
+    'payment_intent.canceled'
+}
+# Failed and canceled intents keep a Stripe status such as requires_payment_method; payments stores
+# them as 'failed' so the analytics "status != 'failed'" filters leave them out
+WEBHOOK_EVENT_PAYMENT_STATUSES = {
+    'payment_intent.payment_failed': 'failed',
+    'payment_intent.canceled': 'failed'
+}
+# Only succeeded is final: a stored 'failed' may be a failed attempt that a later event turns into succeeded
+TERMINAL_PAYMENT_STATUSES = ('succeeded',)
+
+# Connection pool kept at module level so warm invocations reuse connections
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_db_pool_idle: List[Tuple[Any, float]] = []
+_db_pool_lock = threading.Lock()
+_db_pool_stats = {'hits': 0, 'misses': 0, 'discarded': 0}
+
+@contextmanager
+def get_db_connection(database_url: str):
+    '''Выдает соединение из пула модуля и возвращает его после транзакции'''
+    conn = _acquire_db_connection(database_url)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        # A connection that cannot even roll back is not returned to the pool
+        try:
+            conn.rollback()
+            reusable = True
+        except psycopg2.Error:
+            reusable = False
+        _release_db_connection(conn, reusable)
+        raise
+    _release_db_connection(conn, True)
+
+def get_db_pool_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики попаданий и промахов пула соединений'''
+    with _db_pool_lock:
+        stats = dict(_db_pool_stats)
+        stats['idle'] = len(_db_pool_idle)
+    total = stats['hits'] + stats['misses']
+    stats['size'] = DB_POOL_SIZE
+    stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+def _acquire_db_connection(database_url: str):
+    while True:
+        with _db_pool_lock:
+            if not _db_pool_idle:
+                _db_pool_stats['misses'] += 1
+                break
+            conn, released_at = _db_pool_idle.pop()
+        if _db_connection_is_healthy(conn, time.monotonic() - released_at):
+            with _db_pool_lock:
+                _db_pool_stats['hits'] += 1
+            return conn
+        # Broken connection: drop it and rebuild on the next loop iteration
+        with _db_pool_lock:
+            _db_pool_stats['discarded'] += 1
+        _close_db_connection(conn)
+    return psycopg2.connect(database_url)
+
+def _release_db_connection(conn, reusable: bool) -> None:
+    if reusable and not conn.closed:
+        with _db_pool_lock:
+            if len(_db_pool_idle) < DB_POOL_SIZE:
+                _db_pool_idle.append((conn, time.monotonic()))
+                return
+    _close_db_connection(conn)
+
+def _db_connection_is_healthy(conn, idle_seconds: float) -> bool:
+    if conn.closed:
+        return False
+    # Skip the round trip for connections that were used moments ago
+    if idle_seconds < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _close_db_connection(conn) -> None:
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
 def handler(event, context):
     '''
     Business: Process Stripe payment creation for investments and donations
@@ -31,12 +201,64 @@ def handler(event, context):
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, Idempotency-Key, Stripe-Signature',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
+    params = event.get('queryStringParameters') or {}
+    
+    # Outbox drain worker, invoked on a schedule; it does not need Stripe
+    if method == 'POST' and params.get('action') == 'drain_outbox':
+        try:
+            result = drain_outbox(int(params.get('limit', str(OUTBOX_BATCH_SIZE))))
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps(result)
+            }
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Outbox drain failed',
+                    'message': str(e),
+                    'request_id': context.request_id
+                })
+            }
+    
+    # Webhook applier, invoked on a schedule; it does not need Stripe either
+    if method == 'POST' and params.get('action') == 'apply_webhook_events':
+        try:
+            result = apply_webhook_events(int(params.get('limit', str(WEBHOOK_BATCH_SIZE))))
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'isBase64Encoded': False,
+                'body': json.dumps(result)
+            }
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Webhook apply failed',
+                    'message': str(e),
+                    'request_id': context.request_id
+                })
+            }
+    
     # Проверяем наличие Stripe API ключа
     stripe_key = os.environ.get('STRIPE_SECRET_KEY')
     if not stripe_key:
@@ -59,12 +281,49 @@ def handler(event, context):
             'body': json.dumps({'error': 'Stripe library not available'})
         }
     
+    if method == 'POST' and params.get('action') == 'stripe_webhook':
+        try:
+            return receive_stripe_webhook(event, stripe)
+        except Exception as e:
+            # A 5xx makes Stripe redeliver the event later
+            return {
+                'statusCode': 500,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Webhook processing failed',
+                    'message': str(e),
+                    'request_id': context.request_id
+                })
+            }
+    
+    if method == 'POST' and params.get('action') == 'create_batch':
+        try:
+            return create_payment_batch(event, context, stripe)
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'error': 'Internal server error',
+                    'message': str(e),
+                    'request_id': context.request_id
+                })
+            }
+    
     if method == 'GET':
         return {
             'statusCode': 200,
             'headers': {'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'status': 'Payment service is running'})
+            'body': json.dumps({
+                'status': 'Payment service is running',
+                'db_pool': get_db_pool_stats(),
+                'http_targets': get_http_target_stats(),
+                'lottery_registration': get_lottery_registration_stats(),
+                'idempotency': get_idempotency_stats()
+            })
         }
     
     if method == 'POST':
@@ -73,28 +332,44 @@ def handler(event, context):
             body_data = json.loads(event.get('body', '{}'))
             payment_req = PaymentRequest(**body_data)
             
-            # Prepare description and metadata
-            description = f"{payment_req.payment_type.title()}: {payment_req.description or 'No description'}"
-            metadata = {
-                'payment_type': payment_req.payment_type,
-                'request_id': context.request_id
-            }
-            if payment_req.metadata:
-                metadata.update(payment_req.metadata)
+            # A retried request with the same Idempotency-Key gets the stored response back
+            idempotency_key = get_idempotency_key(event)
+            request_hash = make_request_hash(payment_req)
+            if idempotency_key:
+                if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'Idempotency-Key is limited to {MAX_IDEMPOTENCY_KEY_LENGTH} characters'})
+                    }
+                try:
+                    stored = find_idempotent_response(idempotency_key)
+                except Exception as db_error:
+                    # Stripe still deduplicates the intent by the same key
+                    print(f"Idempotency lookup failed: {db_error}")
+                    stored = None
+                if stored is not None:
+                    return build_idempotent_response(stored, request_hash)
+            
+            # Create Stripe PaymentIntent; with a key the parameters depend only on the request body,
+            # because Stripe rejects a key reused with different parameters
+            trace_metadata = {'idempotency_key': idempotency_key} if idempotency_key else {'request_id': context.request_id}
+            intent_params = build_intent_params(payment_req, trace_metadata)
+            metadata = intent_params['metadata']
+            intent = stripe.PaymentIntent.create(**intent_params, idempotency_key=idempotency_key)
             
-            # Create Stripe PaymentIntent
-            intent = stripe.PaymentIntent.create(
-                amount=payment_req.amount,
-                currency=payment_req.currency,
-                description=description,
-                metadata=metadata,
-                automatic_payment_methods={'enabled': True},
-                receipt_email=payment_req.customer_email if payment_req.customer_email else None
-            )
+            response_body = json.dumps({
+                'client_secret': intent.client_secret,
+                'payment_intent_id': intent.id,
+                'amount': payment_req.amount,
+                'currency': payment_req.currency,
+                'status': intent.status
+            })
             
-            # Save payment to database
+            # Save payment to database; lottery registration (unless done in-process) and email go through the outbox
             try:
-                payment_db_id = save_payment_to_db({
+                save_payment_to_db({
                     'payment_intent_id': intent.id,
                     'amount': payment_req.amount,
                     'currency': payment_req.currency,
@@ -104,36 +379,10 @@ def handler(event, context):
                     'description': payment_req.description,
                     'metadata': json.dumps(metadata) if metadata else None,
                     'status': intent.status
-                })
-                
-                # Add to lottery if it's an investment
-                if payment_req.payment_type == 'investment' and payment_db_id:
-                    try:
-                        add_to_lottery({
-                            'payment_id': payment_db_id,
-                            'amount': payment_req.amount,
-                            'email': payment_req.customer_email
-                        })
-                    except Exception as lottery_error:
-                        print(f"Lottery registration failed: {lottery_error}")
-                        
+                }, (idempotency_key, request_hash, response_body) if idempotency_key else None)
             except Exception as db_error:
                 print(f"Database save failed: {db_error}")
             
-            # Отправляем email уведомление
-            try:
-                send_payment_notification({
-                    'payment_id': intent.id,
-                    'amount': intent.amount,
-                    'currency': intent.currency,
-                    'payment_type': payment_req.payment_type,
-                    'payer_email': payment_req.customer_email,
-                    'description': payment_req.description
-                })
-            except Exception as email_error:
-                # Логируем ошибку email, но не прерываем платеж
-                print(f"Email notification failed: {email_error}")
-            
             # Return client secret for frontend
             return {
                 'statusCode': 200,
@@ -142,13 +391,7 @@ def handler(event, context):
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({
-                    'client_secret': intent.client_secret,
-                    'payment_intent_id': intent.id,
-                    'amount': payment_req.amount,
-                    'currency': payment_req.currency,
-                    'status': intent.status
-                })
+                'body': response_body
             }
             
         except ValidationError as e:
@@ -184,15 +427,202 @@ def handler(event, context):
                 })
             }
 
-def save_payment_to_db(payment_data):
-    '''Сохраняет платеж в базу данных'''
+def build_intent_params(payment_req: PaymentRequest, extra_metadata: Dict[str, str]) -> Dict[str, Any]:
+    '''Формирует параметры PaymentIntent: описание и метаданные платежа'''
+    description = f"{payment_req.payment_type.title()}: {payment_req.description or 'No description'}"
+    metadata = {'payment_type': payment_req.payment_type}
+    metadata.update(extra_metadata)
+    if payment_req.metadata:
+        metadata.update(payment_req.metadata)
+    
+    return {
+        'amount': payment_req.amount,
+        'currency': payment_req.currency,
+        'description': description,
+        'metadata': metadata,
+        'automatic_payment_methods': {'enabled': True},
+        'receipt_email': payment_req.customer_email if payment_req.customer_email else None
+    }
+
+def create_payment_batch(event, context, stripe) -> Dict[str, Any]:
+    '''Создает платежи кампании пачкой: одна валидация, параллельные вызовы Stripe, одна вставка'''
+    try:
+        batch_req = PaymentBatchRequest(**json.loads(event.get('body') or '{}'))
+    except (ValidationError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'error': 'Invalid payment batch',
+                'details': e.errors() if isinstance(e, ValidationError) else str(e)
+            })
+        }
+    
+    extra_metadata = {'request_id': context.request_id}
+    if batch_req.campaign:
+        extra_metadata['campaign'] = batch_req.campaign
+    
+    intent_params = [
+        build_intent_params(payment_req, dict(extra_metadata, batch_index=str(index)))
+        for index, payment_req in enumerate(batch_req.payments)
+    ]
+    executor = get_stripe_executor()
+    futures = [executor.submit(stripe.PaymentIntent.create, **params) for params in intent_params]
+    
+    results = []
+    created = []
+    for index, (payment_req, params, future) in enumerate(zip(batch_req.payments, intent_params, futures)):
+        try:
+            intent = future.result()
+        except Exception as e:
+            # A Stripe or network error fails only its own item
+            results.append({'index': index, 'status': 'failed', 'error': str(e)})
+            continue
+        results.append({
+            'index': index,
+            'status': 'created',
+            'client_secret': intent.client_secret,
+            'payment_intent_id': intent.id,
+            'amount': payment_req.amount,
+            'currency': payment_req.currency,
+            'intent_status': intent.status
+        })
+        created.append((payment_req, intent, params['metadata']))
+    
+    save_error = None
+    if created:
+        try:
+            save_payment_batch_to_db(created, batch_req.campaign, len(results) - len(created))
+        except Exception as db_error:
+            print(f"Database save failed: {db_error}")
+            save_error = str(db_error)
+    
+    # Intents that exist in Stripe without payments rows are reported, not hidden behind success
+    body = {
+        'success': save_error is None,
+        'saved': save_error is None,
+        'total': len(results),
+        'created': len(created),
+        'failed': len(results) - len(created),
+        'results': results
+    }
+    if save_error is not None:
+        body['error'] = 'Payments were created in Stripe but could not be saved'
+        body['message'] = save_error
+        body['request_id'] = context.request_id
+    
+    return {
+        'statusCode': 200 if save_error is None else 500,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps(body)
+    }
+
+def get_stripe_executor() -> ThreadPoolExecutor:
+    '''Возвращает пул потоков, ограничивающий параллельные вызовы Stripe'''
+    global _stripe_executor
+    with _http_lock:
+        if _stripe_executor is None:
+            _stripe_executor = ThreadPoolExecutor(max_workers=STRIPE_BATCH_CONCURRENCY, thread_name_prefix='stripe')
+        return _stripe_executor
+
+def save_payment_batch_to_db(created, campaign, failed_count):
+    '''Сохраняет платежи пачки одной вставкой и одно сводное уведомление в outbox'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise Exception("DATABASE_URL not configured")
+    
+    with get_db_connection(database_url) as conn:
+        with conn.cursor() as cursor:
+            inserted = psycopg2.extras.execute_values(cursor, """
+                INSERT INTO payments (
+                    payment_intent_id, amount, currency, payment_type,
+                    customer_email, customer_name, description, metadata, status
+                ) VALUES %s
+                RETURNING id
+            """, [
+                (
+                    intent.id,
+                    payment_req.amount,
+                    payment_req.currency,
+                    payment_req.payment_type,
+                    payment_req.customer_email,
+                    payment_req.customer_name,
+                    payment_req.description,
+                    json.dumps(metadata),
+                    intent.status
+                )
+                for payment_req, intent, metadata in created
+            ], page_size=len(created), fetch=True)
+            payment_ids = [row[0] for row in inserted]
+            
+            outbox_rows = [
+                (payment_id, 'lottery_registration', json.dumps({
+                    'payment_id': payment_id,
+                    'amount': payment_req.amount,
+                    'email': payment_req.customer_email
+                }))
+                for payment_id, (payment_req, _, _) in zip(payment_ids, created)
+                if payment_req.payment_type == 'investment'
+            ]
+            
+            # One summary email for the whole batch, attached to its first payment
+            totals: Dict[str, int] = {}
+            by_type: Dict[str, int] = {}
+            for payment_req, _, _ in created:
+                totals[payment_req.currency] = totals.get(payment_req.currency, 0) + payment_req.amount
+                by_type[payment_req.payment_type] = by_type.get(payment_req.payment_type, 0) + 1
+            outbox_rows.append((payment_ids[0], 'payment_notification', json.dumps({
+                'action': 'payment_batch_notification',
+                'campaign': campaign,
+                'created_count': len(created),
+                'failed_count': failed_count,
+                'totals': totals,
+                'by_type': by_type
+            })))
+            
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO payment_outbox (payment_id, event_type, payload)
+                VALUES %s
+            """, outbox_rows, page_size=len(outbox_rows))
+            conn.commit()
+    return payment_ids
+
+def save_payment_to_db(payment_data, idempotency=None):
+    '''Сохраняет платеж и события outbox в одной транзакции'''
     try:
         database_url = os.environ.get('DATABASE_URL')
         if not database_url:
             raise Exception("DATABASE_URL not configured")
         
-        with psycopg2.connect(database_url) as conn:
+        with get_db_connection(database_url) as conn:
             with conn.cursor() as cursor:
+                if idempotency:
+                    # The key row is claimed first: a concurrent retry that lost the race saves nothing.
+                    # An expired row not yet purged is taken over like a fresh key.
+                    idempotency_key, request_hash, response_body = idempotency
+                    cursor.execute("""
+                        INSERT INTO payment_idempotency_keys (idempotency_key, request_hash, payment_intent_id, response)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (idempotency_key) DO UPDATE
+                        SET
+                            request_hash = EXCLUDED.request_hash,
+                            payment_intent_id = EXCLUDED.payment_intent_id,
+                            response = EXCLUDED.response,
+                            created_at = CURRENT_TIMESTAMP
+                        WHERE payment_idempotency_keys.created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+                        RETURNING idempotency_key
+                    """, (
+                        idempotency_key, request_hash, payment_data['payment_intent_id'], response_body,
+                        IDEMPOTENCY_KEY_RETENTION_HOURS
+                    ))
+                    if cursor.fetchone() is None:
+                        return None
+                
                 cursor.execute("""
                     INSERT INTO payments (
                         payment_intent_id, amount, currency, payment_type,
@@ -211,61 +641,556 @@ def save_payment_to_db(payment_data):
                     payment_data['status']
                 ))
                 payment_id = cursor.fetchone()[0]
+                
+                lottery = None
+                if payment_data['payment_type'] == 'investment':
+                    lottery = register_lottery_inprocess(conn, payment_id, payment_data)
+                
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO payment_outbox (payment_id, event_type, payload)
+                    VALUES %s
+                """, [
+                    (payment_id, event_type, json.dumps(payload))
+                    for event_type, payload in build_outbox_events(payment_id, payment_data, lottery is None)
+                ])
                 conn.commit()
-                return payment_id
+        
+        if idempotency:
+            store_idempotent_response(*idempotency)
+        return payment_id
     except Exception as e:
         print(f"Database error: {e}")
         raise
 
-def add_to_lottery(lottery_data):
-    '''Добавляет платеж в лотерею'''
+def receive_stripe_webhook(event, stripe) -> Dict[str, Any]:
+    '''Проверяет подпись события Stripe и откладывает его в буфер для пакетного применения'''
+    webhook_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    if not webhook_secret:
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Stripe webhook secret not configured'})
+        }
+    
+    # The signature covers the raw body, so it is verified before any parsing
+    payload = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        payload = base64.b64decode(payload).decode('utf-8')
+    signature = next(
+        (value for name, value in (event.get('headers') or {}).items() if name.lower() == 'stripe-signature'),
+        ''
+    )
     try:
-        lottery_url = 'https://functions.poehali.dev/84895621-7397-4c97-a683-4c67fcfd0bad'
-        
-        payload = {
-            'action': 'add_participant',
-            'payment_id': lottery_data['payment_id'],
-            'amount': lottery_data['amount'],
-            'email': lottery_data.get('email')
+        stripe_event = stripe.Webhook.construct_event(payload, signature, webhook_secret)
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Invalid webhook event', 'message': str(e)})
         }
-        
-        response = requests.post(
-            lottery_url,
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        return response.json() if response.status_code == 200 else None
-        
+    
+    result = {'received': True, 'event_id': stripe_event['id']}
+    if stripe_event['type'] not in WEBHOOK_EVENT_TYPES:
+        result['ignored'] = True
+    else:
+        result['duplicate'] = not buffer_webhook_event(stripe_event)
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps(result)
+    }
+
+def buffer_webhook_event(stripe_event) -> bool:
+    '''Сохраняет событие в буфер; False, если событие с таким id уже получено'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise Exception("DATABASE_URL not configured")
+    
+    intent = stripe_event['data']['object']
+    with get_db_connection(database_url) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO stripe_webhook_events (
+                    event_id, event_type, payment_intent_id, intent_status, event_created
+                ) VALUES (%s, %s, %s, %s, to_timestamp(%s))
+                ON CONFLICT (event_id) DO NOTHING
+                RETURNING event_id
+            """, (
+                stripe_event['id'],
+                stripe_event['type'],
+                intent['id'],
+                intent['status'],
+                stripe_event['created']
+            ))
+            return cursor.fetchone() is not None
+
+def apply_webhook_events(limit):
+    '''Применяет накопленные события Stripe к статусам платежей одним UPDATE на пачку'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise Exception("DATABASE_URL not configured")
+    
+    with get_db_connection(database_url) as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT event_id, event_type, payment_intent_id, intent_status, event_created, attempts,
+                       received_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second' as expired
+                FROM stripe_webhook_events
+                WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (WEBHOOK_PENDING_TIMEOUT_SECONDS, max(1, min(limit, WEBHOOK_BATCH_SIZE * 10))))
+            events = cursor.fetchall()
+            for event in events:
+                event['payment_status'] = WEBHOOK_EVENT_PAYMENT_STATUSES.get(event['event_type'], event['intent_status'])
+            
+            # Only the newest event per intent matters; terminal statuses win creation-time ties
+            latest = {}
+            for event in events:
+                rank = (event['event_created'], event['payment_status'] in TERMINAL_PAYMENT_STATUSES)
+                current = latest.get(event['payment_intent_id'])
+                if current is None or rank > current[0]:
+                    latest[event['payment_intent_id']] = (rank, event)
+            
+            updated = set()
+            if latest:
+                # Stale events (older than the last applied one) and terminal payments are left alone
+                rows = psycopg2.extras.execute_values(cursor, """
+                    UPDATE payments p
+                    SET
+                        status = v.status,
+                        completed_at = CASE
+                            WHEN v.status = 'succeeded' THEN COALESCE(p.completed_at, v.event_created)
+                            ELSE p.completed_at
+                        END,
+                        status_event_at = v.event_created
+                    FROM (VALUES %s) AS v(payment_intent_id, status, event_created)
+                    WHERE p.payment_intent_id = v.payment_intent_id
+                    AND (p.status_event_at IS NULL OR p.status_event_at <= v.event_created)
+                    AND p.status <> 'succeeded'
+                    RETURNING p.payment_intent_id
+                """, [
+                    (event['payment_intent_id'], event['payment_status'], event['event_created'])
+                    for _, event in latest.values()
+                ], template='(%s, %s, %s::timestamptz)', page_size=len(latest), fetch=True)
+                updated = {row['payment_intent_id'] for row in rows}
+            
+            # Events for payments not saved yet are deferred with backoff until they expire
+            unsaved = set()
+            candidates = [event['payment_intent_id'] for _, event in latest.values() if event['payment_intent_id'] not in updated]
+            if candidates:
+                cursor.execute("""
+                    SELECT payment_intent_id FROM payments
+                    WHERE payment_intent_id = ANY(%s)
+                """, (candidates,))
+                unsaved = set(candidates) - {row['payment_intent_id'] for row in cursor.fetchall()}
+            
+            outcomes = []
+            deferred = []
+            for event in events:
+                newest = latest[event['payment_intent_id']][1] is event
+                if newest and event['payment_intent_id'] in updated:
+                    outcomes.append((event['event_id'], 'applied'))
+                elif newest and event['payment_intent_id'] in unsaved and not event['expired']:
+                    delay = min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** event['attempts'], WEBHOOK_RETRY_MAX_SECONDS)
+                    deferred.append((event['event_id'], delay))
+                else:
+                    outcomes.append((event['event_id'], 'ignored'))
+            
+            if outcomes:
+                psycopg2.extras.execute_values(cursor, """
+                    UPDATE stripe_webhook_events e
+                    SET
+                        status = v.status,
+                        applied_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v(event_id, status)
+                    WHERE e.event_id = v.event_id
+                """, outcomes)
+            if deferred:
+                psycopg2.extras.execute_values(cursor, """
+                    UPDATE stripe_webhook_events e
+                    SET
+                        attempts = e.attempts + 1,
+                        next_attempt_at = CURRENT_TIMESTAMP + v.delay * INTERVAL '1 second'
+                    FROM (VALUES %s) AS v(event_id, delay)
+                    WHERE e.event_id = v.event_id
+                """, deferred, template='(%s, %s::integer)')
+            conn.commit()
+    
+    applied = sum(1 for _, status in outcomes if status == 'applied')
+    return {
+        'success': True,
+        'processed': len(events),
+        'applied': applied,
+        'ignored': len(outcomes) - applied,
+        'pending': len(deferred)
+    }
+
+def get_idempotency_key(event) -> Optional[str]:
+    '''Возвращает заголовок Idempotency-Key без учета регистра'''
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key' and value:
+            return value.strip() or None
+    return None
+
+def make_request_hash(payment_req: PaymentRequest) -> str:
+    '''Хеш параметров платежа: ключ нельзя повторно использовать для другого запроса'''
+    canonical = json.dumps(payment_req.model_dump(), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def find_idempotent_response(idempotency_key: str) -> Optional[Tuple[str, str]]:
+    '''Ищет сохраненный ответ по ключу: сначала в памяти, затем одним чтением по первичному ключу'''
+    now = time.monotonic()
+    with _idempotency_cache_lock:
+        cached = _idempotency_cache.get(idempotency_key)
+        if cached is not None and now - cached[0] < IDEMPOTENCY_CACHE_TTL_SECONDS:
+            _idempotency_cache.move_to_end(idempotency_key)
+            _idempotency_stats['cache_hits'] += 1
+            return cached[1], cached[2]
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise Exception("DATABASE_URL not configured")
+    
+    with get_db_connection(database_url) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT request_hash, response
+                FROM payment_idempotency_keys
+                WHERE idempotency_key = %s
+                AND created_at > CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+            """, (idempotency_key, IDEMPOTENCY_KEY_RETENTION_HOURS))
+            row = cursor.fetchone()
+    
+    with _idempotency_cache_lock:
+        _idempotency_stats['db_hits' if row else 'misses'] += 1
+    if row is None:
+        return None
+    store_idempotent_response(idempotency_key, row[0], row[1])
+    return row[0], row[1]
+
+def store_idempotent_response(idempotency_key: str, request_hash: str, response_body: str) -> None:
+    with _idempotency_cache_lock:
+        _idempotency_cache[idempotency_key] = (time.monotonic(), request_hash, response_body)
+        _idempotency_cache.move_to_end(idempotency_key)
+        while len(_idempotency_cache) > IDEMPOTENCY_CACHE_MAX_ENTRIES:
+            _idempotency_cache.popitem(last=False)
+
+def build_idempotent_response(stored: Tuple[str, str], request_hash: str) -> Dict[str, Any]:
+    '''Повторяет сохраненный ответ или отклоняет ключ, использованный с другими параметрами'''
+    stored_hash, response_body = stored
+    if stored_hash != request_hash:
+        with _idempotency_cache_lock:
+            _idempotency_stats['conflicts'] += 1
+        return {
+            'statusCode': 422,
+            'headers': {'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Idempotency-Key was already used with different payment data'})
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Idempotent-Replayed': 'true'
+        },
+        'isBase64Encoded': False,
+        'body': response_body
+    }
+
+def get_idempotency_stats() -> Dict[str, Any]:
+    '''Возвращает счетчики повторов по Idempotency-Key'''
+    with _idempotency_cache_lock:
+        stats = dict(_idempotency_stats)
+        stats['cached_keys'] = len(_idempotency_cache)
+    stats['ttl_seconds'] = IDEMPOTENCY_CACHE_TTL_SECONDS
+    return stats
+
+def register_lottery_inprocess(conn, payment_id, payment_data):
+    '''Регистрирует инвестора в лотерее в транзакции платежа; возвращает модуль лотереи или None'''
+    lottery = get_lottery_module()
+    if lottery is None:
+        return None
+    
+    # A savepoint keeps the payment if registration fails; the outbox then retries over HTTP
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute("SAVEPOINT lottery_registration")
+        try:
+            lottery.register_lottery_participant(cursor, {
+                'payment_id': payment_id,
+                'amount': payment_data['amount'],
+                'email': payment_data.get('customer_email')
+            })
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT lottery_registration")
+            print(f"In-process lottery registration failed, using outbox: {e}")
+            with _lottery_module_lock:
+                _lottery_registration_stats['fallback'] += 1
+            return None
+        cursor.execute("RELEASE SAVEPOINT lottery_registration")
+    
+    with _lottery_module_lock:
+        _lottery_registration_stats['inprocess'] += 1
+    return lottery
+
+def get_lottery_module():
+    '''Загружает код функции лотереи, если он развернут рядом и включен режим inprocess'''
+    if LOTTERY_REGISTRATION_MODE != 'inprocess':
+        return None
+    
+    with _lottery_module_lock:
+        if not _lottery_module['loaded']:
+            _lottery_module['loaded'] = True
+            try:
+                spec = importlib.util.spec_from_file_location('lottery_function', LOTTERY_MODULE_PATH)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _lottery_module['module'] = module
+            except (ImportError, OSError) as e:
+                # Split deployment: registration stays on the HTTP outbox path
+                print(f"Lottery module not available, using outbox: {e}")
+        return _lottery_module['module']
+
+def get_lottery_registration_stats() -> Dict[str, Any]:
+    '''Возвращает режим регистрации в лотерее и число регистраций по каждому пути'''
+    with _lottery_module_lock:
+        stats = dict(_lottery_registration_stats)
+        stats['mode'] = LOTTERY_REGISTRATION_MODE
+        stats['module_loaded'] = _lottery_module['module'] is not None
+    return stats
+
+def build_outbox_events(payment_id, payment_data, include_lottery=True) -> List[Tuple[str, Dict[str, Any]]]:
+    '''Формирует события outbox для сохраненного платежа'''
+    events = []
+    
+    # Add to lottery if it's an investment not already registered in-process
+    if include_lottery and payment_data['payment_type'] == 'investment':
+        events.append(('lottery_registration', {
+            'payment_id': payment_id,
+            'amount': payment_data['amount'],
+            'email': payment_data.get('customer_email')
+        }))
+    
+    events.append(('payment_notification', {
+        'action': 'payment_notification',
+        'payment_id': payment_data['payment_intent_id'],
+        'amount': payment_data['amount'],
+        'currency': payment_data['currency'],
+        'payment_type': payment_data['payment_type'],
+        'payer_email': payment_data.get('customer_email'),
+        'description': payment_data.get('description')
+    }))
+    return events
+
+def drain_outbox(limit):
+    '''Доставляет накопленные события outbox пачкой с повторами'''
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise Exception("DATABASE_URL not configured")
+    
+    # Deliveries happen outside any transaction: claiming commits a lease, outcomes are written afterwards
+    events = claim_outbox_events(database_url, max(1, min(limit, OUTBOX_BATCH_SIZE * 10)))
+    outcomes = deliver_outbox_events(events)
+    
+    rows = []
+    for event in events:
+        error = outcomes.get(event['id'])
+        if error is None:
+            rows.append((event['id'], 'delivered', event['attempts'], 0, None))
+        else:
+            status = 'failed' if event['attempts'] >= OUTBOX_MAX_ATTEMPTS else 'pending'
+            delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (event['attempts'] - 1), OUTBOX_RETRY_MAX_SECONDS)
+            rows.append((event['id'], status, event['attempts'], delay, error[:1000]))
+    
+    with get_db_connection(database_url) as conn:
+        with conn.cursor() as cursor:
+            if rows:
+                # attempts identifies the lease: a row re-claimed after its lease expired is left to the new owner
+                psycopg2.extras.execute_values(cursor, """
+                    UPDATE payment_outbox o
+                    SET
+                        status = v.status,
+                        next_attempt_at = CURRENT_TIMESTAMP + v.delay * INTERVAL '1 second',
+                        last_error = v.last_error,
+                        delivered_at = CASE WHEN v.status = 'delivered' THEN CURRENT_TIMESTAMP END
+                    FROM (VALUES %s) AS v(id, status, attempts, delay, last_error)
+                    WHERE o.id = v.id AND o.status = 'pending' AND o.attempts = v.attempts
+                """, rows, template='(%s::bigint, %s, %s::integer, %s::integer, %s)')
+            conn.commit()
+            
+            # Housekeeping on the same schedule: expired idempotency keys still hold client secrets
+            cursor.execute("""
+                DELETE FROM payment_idempotency_keys
+                WHERE idempotency_key IN (
+                    SELECT idempotency_key FROM payment_idempotency_keys
+                    WHERE created_at <= CURRENT_TIMESTAMP - %s * INTERVAL '1 hour'
+                    ORDER BY created_at
+                    LIMIT %s
+                )
+            """, (IDEMPOTENCY_KEY_RETENTION_HOURS, IDEMPOTENCY_PURGE_BATCH_SIZE))
+            purged_keys = cursor.rowcount
+            conn.commit()
+    
+    delivered = sum(1 for row in rows if row[1] == 'delivered')
+    return {
+        'success': True,
+        'processed': len(rows),
+        'delivered': delivered,
+        'retrying': sum(1 for row in rows if row[1] == 'pending'),
+        'failed': sum(1 for row in rows if row[1] == 'failed'),
+        'purged_idempotency_keys': purged_keys
+    }
+
+def claim_outbox_events(database_url: str, limit: int) -> List[Dict[str, Any]]:
+    '''Захватывает готовые события outbox: увеличивает attempts и откладывает next_attempt_at на время аренды'''
+    with get_db_connection(database_url) as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            # A lease that ran out on the last allowed attempt means the delivery never reported back
+            cursor.execute("""
+                UPDATE payment_outbox
+                SET status = 'failed', last_error = COALESCE(last_error, 'Delivery lease expired')
+                WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP AND attempts >= %s
+            """, (OUTBOX_MAX_ATTEMPTS,))
+            
+            # SKIP LOCKED lets overlapping drain runs split the backlog instead of blocking
+            cursor.execute("""
+                UPDATE payment_outbox o
+                SET
+                    attempts = o.attempts + 1,
+                    next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                FROM (
+                    SELECT id
+                    FROM payment_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) ready
+                WHERE o.id = ready.id
+                RETURNING o.id, o.event_type, o.payload, o.attempts
+            """, (OUTBOX_LEASE_SECONDS, limit))
+            events = cursor.fetchall()
+            conn.commit()
+    return events
+
+def deliver_outbox_events(events) -> Dict[int, Optional[str]]:
+    '''Доставляет события outbox; возвращает текст ошибки (или None) по id события'''
+    # Independent downstream calls run concurrently on the shared fan-out pool
+    executor = get_http_executor()
+    registrations = [e for e in events if e['event_type'] == 'lottery_registration']
+    lottery_future = executor.submit(deliver_lottery_registrations, registrations) if registrations else None
+    notification_futures = {
+        event['id']: executor.submit(deliver_payment_notification, event['payload'])
+        for event in events
+        if event['event_type'] == 'payment_notification'
+    }
+    
+    outcomes = lottery_future.result() if lottery_future else {}
+    for event_id, future in notification_futures.items():
+        outcomes[event_id] = future.result()
+    return outcomes
+
+def deliver_lottery_registrations(events) -> Dict[int, Optional[str]]:
+    '''Регистрирует пачку инвестиций в лотерее одним вызовом add_participants'''
+    try:
+        response = post_to_function('lottery', LOTTERY_FUNCTION_URL, {
+            'action': 'add_participants',
+            'payments': [event['payload'] for event in events]
+        })
+        if response.status_code != 200:
+            raise Exception(f"Lottery responded with {response.status_code}")
+        results = response.json().get('results', [])
     except Exception as e:
         print(f"Failed to add to lottery: {e}")
-        return None
+        return {event['id']: str(e) for event in events}
+    
+    # Already registered payments count as delivered, which makes retries idempotent
+    outcomes = {}
+    for event, result in zip(events, results):
+        if result.get('status') in ('added', 'duplicate'):
+            outcomes[event['id']] = None
+        else:
+            outcomes[event['id']] = result.get('error') or 'Lottery rejected registration'
+    for event in events[len(results):]:
+        outcomes[event['id']] = 'Missing lottery result'
+    return outcomes
 
-def send_payment_notification(payment_data):
-    '''Отправляет уведомление о платеже через email сервис'''
+def deliver_payment_notification(payload) -> Optional[str]:
+    '''Отправляет уведомление о платеже через email сервис; возвращает текст ошибки или None'''
     try:
-        email_url = 'https://functions.poehali.dev/02a484b7-65f0-4f91-9812-ee40c53aff64'
-        
-        payload = {
-            'action': 'payment_notification',
-            'payment_id': payment_data['payment_id'],
-            'amount': payment_data['amount'],
-            'currency': payment_data['currency'],
-            'payment_type': payment_data['payment_type'],
-            'payer_email': payment_data.get('payer_email'),
-            'description': payment_data.get('description')
-        }
-        
-        response = requests.post(
-            email_url,
-            json=payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        return response.json() if response.status_code == 200 else None
-        
+        response = post_to_function('email', EMAIL_FUNCTION_URL, payload)
+        if response.status_code != 200:
+            raise Exception(f"Email service responded with {response.status_code}")
+        # The email function answers 200 with success=false when SendGrid or its config fails
+        result = response.json()
+        if result.get('success') is not True:
+            raise Exception(result.get('error') or 'Email service did not confirm the send')
+        return None
     except Exception as e:
         print(f"Failed to send email notification: {e}")
-        return None
\ No newline at end of file
+        return str(e)
+
+def get_http_session() -> requests.Session:
+    '''Возвращает общую keep-alive сессию с пулом соединений'''
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            _http_session = session
+        return _http_session
+
+def get_http_executor() -> ThreadPoolExecutor:
+    '''Возвращает небольшой пул потоков для параллельных вызовов функций'''
+    global _http_executor
+    with _http_lock:
+        if _http_executor is None:
+            _http_executor = ThreadPoolExecutor(max_workers=HTTP_FANOUT_WORKERS, thread_name_prefix='fanout')
+        return _http_executor
+
+def post_to_function(target: str, url: str, payload: Dict[str, Any]) -> requests.Response:
+    '''POST в другую функцию через общую сессию с учетом задержки по цели'''
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        response = get_http_session().post(url, json=payload, timeout=HTTP_TIMEOUT_SECONDS)
+        succeeded = response.status_code == 200
+        return response
+    finally:
+        record_http_latency(target, (time.perf_counter() - started) * 1000, succeeded)
+
+def record_http_latency(target: str, elapsed_ms: float, succeeded: bool) -> None:
+    with _http_lock:
+        stats = _http_target_stats.setdefault(target, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += 0 if succeeded else 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        stats['last_ms'] = elapsed_ms
+
+def get_http_target_stats() -> Dict[str, Dict[str, Any]]:
+    '''Возвращает число вызовов, ошибок и задержки по каждой функции-получателю'''
+    with _http_lock:
+        return {
+            target: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 2),
+                'max_ms': round(stats['max_ms'], 2),
+                'last_ms': round(stats['last_ms'], 2)
+            }
+            for target, stats in _http_target_stats.items()
+        }
@@ -0,0 +1,94 @@
+'''
+Business: Compare raw-payments chart aggregation with reads from payments_daily_rollup on synthetic payments
+Usage: DATABASE_URL=postgres://... python benchmarks/analytics_charts.py [--rows 10000000] [--days 30 365] [--repeats 5]
+Notes: payments and the rollup are generated into a scratch schema that shadows public tables and is dropped at the end
+'''
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import create_synthetic_payments, drop_synthetic_payments, get_database_url, load_function_module
+
+# get_chart_data before the rollup: two aggregations over raw payments
+LEGACY_CHART_QUERIES = [
+    """
+    SELECT 
+        DATE(created_at) as date,
+        COUNT(*) as count,
+        SUM(amount) as amount,
+        COUNT(CASE WHEN payment_type = 'donation' THEN 1 END) as donations,
+        COUNT(CASE WHEN payment_type = 'investment' THEN 1 END) as investments
+    FROM payments 
+    WHERE created_at >= NOW() - INTERVAL '%s days'
+    AND status != 'failed'
+    GROUP BY DATE(created_at)
+    ORDER BY date DESC
+    """,
+    """
+    SELECT 
+        payment_type,
+        COUNT(*) as count,
+        SUM(amount) as amount
+    FROM payments 
+    WHERE created_at >= NOW() - INTERVAL '%s days'
+    AND status != 'failed'
+    GROUP BY payment_type
+    """
+]
+
+def legacy_chart_data(cursor, days):
+    for query in LEGACY_CHART_QUERIES:
+        cursor.execute(query, (days,))
+        cursor.fetchall()
+
+def time_call(conn, run, days, repeats):
+    timings = []
+    for _ in range(repeats):
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            started = time.perf_counter()
+            run(cursor, days)
+            timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytics charts before/after timings')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    analytics = load_function_module('analytics')
+    conn = psycopg2.connect(get_database_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            create_synthetic_payments(cursor, args.rows)
+            cursor.execute("VACUUM ANALYZE payments")
+            cursor.execute("CREATE TABLE payments_daily_rollup (LIKE public.payments_daily_rollup INCLUDING ALL)")
+            started = time.perf_counter()
+            cursor.execute("SELECT public.rebuild_payments_daily_rollup()")
+            rollup_rows = cursor.fetchone()[0]
+            print(json.dumps({
+                'rows': args.rows,
+                'rollup_rows': rollup_rows,
+                'rebuild_seconds': round(time.perf_counter() - started, 1)
+            }))
+        
+        for days in args.days:
+            print(json.dumps({
+                'rows': args.rows,
+                'days': days,
+                'before_ms': time_call(conn, legacy_chart_data, days, args.repeats),
+                'rollup_ms': time_call(conn, analytics.get_chart_data, days, args.repeats)
+            }))
+    finally:
+        with conn.cursor() as cursor:
+            drop_synthetic_payments(cursor)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
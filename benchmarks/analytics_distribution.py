@@ -0,0 +1,88 @@
+'''
+Business: Compare exact amount percentiles over raw payments with merged daily sketches from payments_daily_rollup
+Usage: DATABASE_URL=postgres://... python benchmarks/analytics_distribution.py [--rows 10000000] [--days 30 365] [--repeats 5]
+Notes: payments and the rollup are generated into a scratch schema that shadows public tables and is dropped at the end
+'''
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import create_synthetic_payments, drop_synthetic_payments, get_database_url, load_function_module
+
+EXACT_PERCENTILES_QUERY = """
+    SELECT percentile_disc(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY amount) as percentiles
+    FROM payments
+    WHERE created_at >= %s
+    AND created_at < %s
+    AND status != 'failed'
+"""
+
+def exact_percentiles(cursor, from_day, to_day):
+    cursor.execute(EXACT_PERCENTILES_QUERY, (from_day, to_day + timedelta(days=1)))
+    return [amount / 100 for amount in cursor.fetchone()['percentiles']]
+
+def time_call(conn, run, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            started = time.perf_counter()
+            result = run(cursor)
+            timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Exact vs sketch amount percentiles')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    analytics = load_function_module('analytics')
+    conn = psycopg2.connect(get_database_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            create_synthetic_payments(cursor, args.rows)
+            cursor.execute("VACUUM ANALYZE payments")
+            cursor.execute("CREATE TABLE payments_daily_rollup (LIKE public.payments_daily_rollup INCLUDING ALL)")
+            started = time.perf_counter()
+            cursor.execute("SELECT public.rebuild_payments_daily_rollup()")
+            rollup_rows = cursor.fetchone()[0]
+            print(json.dumps({
+                'rows': args.rows,
+                'rollup_rows': rollup_rows,
+                'rebuild_seconds': round(time.perf_counter() - started, 1)
+            }))
+        
+        to_day = datetime.utcnow().date()
+        for days in args.days:
+            from_day = to_day - timedelta(days=days - 1)
+            exact_ms, exact = time_call(conn, lambda cursor: exact_percentiles(cursor, from_day, to_day), args.repeats)
+            sketch_ms, sketch = time_call(
+                conn,
+                lambda cursor: analytics.get_amount_distribution(cursor, from_day.isoformat(), to_day.isoformat(), None, 20),
+                args.repeats
+            )
+            estimates = [sketch['median_usd'], sketch['p90_usd'], sketch['p99_usd']]
+            print(json.dumps({
+                'rows': args.rows,
+                'days': days,
+                'exact_ms': exact_ms,
+                'sketch_ms': sketch_ms,
+                'exact_usd': exact,
+                'sketch_usd': estimates,
+                'max_relative_error': round(max(abs(e - x) / x for e, x in zip(estimates, exact) if x), 4)
+            }))
+    finally:
+        with conn.cursor() as cursor:
+            drop_synthetic_payments(cursor)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''
+Business: Compare OFFSET paging plus COUNT(*) with keyset paging plus rollup totals for the analytics payments list
+Usage: DATABASE_URL=postgres://... python benchmarks/analytics_payments_page.py [--rows 10000000] [--pages 1 100 10000]
+Notes: payments and the rollup are generated into a scratch schema that shadows public tables and is dropped at the end
+'''
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import (
+    apply_payments_indexes, create_synthetic_payments, drop_synthetic_payments, get_database_url, load_function_module
+)
+
+PAGE_SIZE = 50
+
+# get_payments_list before keyset paging: exact count plus LIMIT/OFFSET
+LEGACY_COUNT_QUERY = "SELECT COUNT(*) as total FROM payments WHERE status != 'failed'"
+LEGACY_PAGE_QUERY = """
+    SELECT 
+        id, payment_intent_id, amount, currency, payment_type, status,
+        customer_email, customer_name, description,
+        created_at, completed_at
+    FROM payments 
+    WHERE status != 'failed'
+    ORDER BY created_at DESC 
+    LIMIT %s OFFSET %s
+"""
+
+def legacy_page(cursor, offset):
+    cursor.execute(LEGACY_COUNT_QUERY)
+    cursor.fetchone()
+    cursor.execute(LEGACY_PAGE_QUERY, (PAGE_SIZE, offset))
+    cursor.fetchall()
+
+def cursor_before_offset(analytics, cursor, offset):
+    '''Курсор, с которого начинается страница с данным смещением'''
+    if offset == 0:
+        return None
+    cursor.execute("""
+        SELECT created_at, id FROM payments
+        WHERE status != 'failed'
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1 OFFSET %s
+    """, (offset - 1,))
+    row = cursor.fetchone()
+    return analytics.encode_payments_cursor(row['created_at'], row['id'])
+
+def median_ms(run, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Payments list paging before/after timings')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    analytics = load_function_module('analytics')
+    conn = psycopg2.connect(get_database_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            create_synthetic_payments(cursor, args.rows)
+            apply_payments_indexes(cursor, 'V0013__index_payments_keyset.sql')
+            cursor.execute("CREATE TABLE payments_daily_rollup (LIKE public.payments_daily_rollup INCLUDING ALL)")
+            cursor.execute("SELECT public.rebuild_payments_daily_rollup()")
+            cursor.execute("VACUUM ANALYZE payments")
+        
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            for page in args.pages:
+                offset = (page - 1) * PAGE_SIZE
+                after = cursor_before_offset(analytics, cursor, offset)
+                print(json.dumps({
+                    'rows': args.rows,
+                    'page': page,
+                    'offset_count_ms': median_ms(lambda: legacy_page(cursor, offset), args.repeats),
+                    'keyset_rollup_total_ms': median_ms(
+                        lambda: analytics.get_payments_list(cursor, PAGE_SIZE, 0, after=after), args.repeats
+                    )
+                }))
+    finally:
+        with conn.cursor() as cursor:
+            drop_synthetic_payments(cursor)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
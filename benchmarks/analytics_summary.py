@@ -0,0 +1,115 @@
+'''
+Business: Compare the three-query analytics summary with the single-pass FILTER version on synthetic payments
+Usage: DATABASE_URL=postgres://... python benchmarks/analytics_summary.py [--rows 10000000] [--repeats 5]
+Notes: payments are generated into a scratch schema that shadows public.payments and is dropped at the end
+'''
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import create_synthetic_payments, drop_synthetic_payments, get_database_url, load_function_module
+
+# get_summary_stats before the single-pass rewrite
+LEGACY_SUMMARY_QUERIES = [
+    """
+    SELECT 
+        COUNT(*) as total_payments,
+        COALESCE(SUM(amount), 0) as total_amount,
+        COUNT(CASE WHEN payment_type = 'donation' THEN 1 END) as total_donations,
+        COUNT(CASE WHEN payment_type = 'investment' THEN 1 END) as total_investments,
+        COALESCE(SUM(CASE WHEN payment_type = 'donation' THEN amount ELSE 0 END), 0) as donations_amount,
+        COALESCE(SUM(CASE WHEN payment_type = 'investment' THEN amount ELSE 0 END), 0) as investments_amount
+    FROM payments
+    WHERE status != 'failed'
+    """,
+    """
+    SELECT 
+        COUNT(*) as recent_payments,
+        COALESCE(SUM(amount), 0) as recent_amount
+    FROM payments 
+    WHERE created_at >= NOW() - INTERVAL '30 days'
+    AND status != 'failed'
+    """,
+    """
+    SELECT COALESCE(AVG(amount), 0) as avg_amount
+    FROM payments 
+    WHERE status != 'failed'
+    """
+]
+
+class RecordingCursor(psycopg2.extras.RealDictCursor):
+    '''Курсор, запоминающий выполненные запросы для EXPLAIN'''
+    recorded = []
+    
+    def execute(self, query, vars=None):
+        RecordingCursor.recorded.append((query, vars))
+        return super().execute(query, vars)
+
+def legacy_summary(cursor):
+    for query in LEGACY_SUMMARY_QUERIES:
+        cursor.execute(query)
+        cursor.fetchone()
+
+def measure(conn, run, repeats):
+    '''Медиана времени run(cursor) и число сканирований payments по EXPLAIN ANALYZE'''
+    timings = []
+    for _ in range(repeats):
+        RecordingCursor.recorded = []
+        with conn.cursor(cursor_factory=RecordingCursor) as cursor:
+            started = time.perf_counter()
+            run(cursor)
+            timings.append((time.perf_counter() - started) * 1000)
+    
+    scans = 0
+    buffers = 0
+    with conn.cursor() as cursor:
+        for query, params in RecordingCursor.recorded:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + query, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            scans += count_payment_scans(plan)
+            buffers += plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'queries': len(RecordingCursor.recorded),
+        'payments_scans': scans,
+        'shared_buffers': buffers
+    }
+
+def count_payment_scans(plan) -> int:
+    own = 1 if plan.get('Relation Name') == 'payments' and 'Scan' in plan['Node Type'] else 0
+    return own + sum(count_payment_scans(child) for child in plan.get('Plans', []))
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytics summary before/after timings')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    
+    analytics = load_function_module('analytics')
+    conn = psycopg2.connect(get_database_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            create_synthetic_payments(cursor, args.rows)
+            cursor.execute("VACUUM ANALYZE payments")
+            print(json.dumps({'generated_rows': args.rows, 'seconds': round(time.perf_counter() - started, 1)}))
+        
+        results = {
+            'before': measure(conn, legacy_summary, args.repeats),
+            'single_pass': measure(conn, analytics.get_summary_stats, args.repeats)
+        }
+        
+        for label, result in results.items():
+            print(json.dumps(dict(result, variant=label, rows=args.rows)))
+    finally:
+        with conn.cursor() as cursor:
+            drop_synthetic_payments(cursor)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+'''
+Business: Benchmark the lottery draw, participants listing and status read on synthetic rounds
+Usage: DATABASE_URL=postgres://... python benchmarks/lottery_suite.py [--sizes 1000,100000,1000000,10000000] [--output lottery_bench.json]
+Notes: each synthetic round lives in a transaction that is rolled back; commits issued by the
+       functions under test are counted as round trips but not executed
+'''
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from synthetic import (
+    SYNTHETIC_ROUND_BASE, create_synthetic_round, get_database_url, load_function_module, peak_rss_mb
+)
+
+DEFAULT_SIZES = '1000,100000,1000000,10000000'
+
+_counting_cursor_classes = {}
+
+def counting_cursor_class(base):
+    '''Подкласс курсора, считающий обращения к серверу'''
+    if base not in _counting_cursor_classes:
+        class CountingCursor(base):
+            def execute(self, query, vars=None):
+                self.connection.round_trips += 1
+                return super().execute(query, vars)
+            
+            def executemany(self, query, vars_list):
+                self.connection.round_trips += 1
+                return super().executemany(query, vars_list)
+            
+            def fetchmany(self, size=None):
+                if self.name:
+                    self.connection.round_trips += 1
+                return super().fetchmany(size) if size is not None else super().fetchmany()
+            
+            def __iter__(self):
+                if not self.name:
+                    yield from super().__iter__()
+                    return
+                # Named cursors FETCH itersize rows per round trip while iterating
+                rows = 0
+                for row in super().__iter__():
+                    if rows % self.itersize == 0:
+                        self.connection.round_trips += 1
+                    rows += 1
+                    yield row
+        
+        _counting_cursor_classes[base] = CountingCursor
+    return _counting_cursor_classes[base]
+
+class CountingConnection(psycopg2.extensions.connection):
+    '''Соединение, считающее запросы и откладывающее коммиты тестируемого кода'''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+    
+    def cursor(self, *args, **kwargs):
+        base = kwargs.pop('cursor_factory', None) or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=counting_cursor_class(base), **kwargs)
+    
+    def commit(self):
+        self.round_trips += 1
+
+def measure(conn, operation):
+    '''Запускает операцию дважды внутри точек сохранения: на время и на память'''
+    with conn.cursor() as cursor:
+        cursor.execute('SAVEPOINT bench_op')
+    conn.round_trips = 0
+    started = time.perf_counter()
+    operation()
+    wall_ms = (time.perf_counter() - started) * 1000
+    round_trips = conn.round_trips
+    with conn.cursor() as cursor:
+        cursor.execute('ROLLBACK TO SAVEPOINT bench_op')
+    
+    tracemalloc.start()
+    operation()
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with conn.cursor() as cursor:
+        cursor.execute('ROLLBACK TO SAVEPOINT bench_op')
+    
+    return {
+        'wall_ms': round(wall_ms, 2),
+        'sql_round_trips': round_trips,
+        'python_peak_mb': round(python_peak / (1024 * 1024), 2),
+        'process_peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Lottery benchmark suite')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated ticket counts per round')
+    parser.add_argument('--tickets-per-participant', type=int, default=5)
+    parser.add_argument('--output', default='lottery_bench.json')
+    parser.add_argument('--label', default=None, help='free-form label stored with the results')
+    args = parser.parse_args()
+    
+    lottery = load_function_module('lottery')
+    conn = psycopg2.connect(get_database_url(), connection_factory=CountingConnection)
+    
+    with conn.cursor() as cursor:
+        cursor.execute('SHOW server_version')
+        server_version = cursor.fetchone()[0]
+    
+    results = []
+    for index, tickets in enumerate(int(size) for size in args.sizes.split(',')):
+        participants = max(1, tickets // args.tickets_per_participant)
+        round_num = SYNTHETIC_ROUND_BASE + index + 1
+        try:
+            with conn.cursor() as cursor:
+                started = time.perf_counter()
+                create_synthetic_round(cursor, round_num, participants, args.tickets_per_participant, is_active=True)
+                setup_s = time.perf_counter() - started
+            
+            def run_draw():
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                    lottery.conduct_lottery_draw(cursor, conn, {})
+            
+            def run_participants():
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                    lottery.get_lottery_participants(cursor, conn, round_num)
+            
+            def run_status():
+                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                    lottery.get_lottery_status(cursor)
+            
+            for name, operation in (('draw', run_draw), ('participants', run_participants), ('status', run_status)):
+                entry = {
+                    'operation': name,
+                    'tickets': participants * args.tickets_per_participant,
+                    'participants': participants,
+                    'setup_s': round(setup_s, 1)
+                }
+                entry.update(measure(conn, operation))
+                results.append(entry)
+                print(json.dumps(entry), file=sys.stderr)
+        finally:
+            conn.rollback()
+    
+    conn.close()
+    
+    report = {
+        'label': args.label,
+        'git_revision': git_revision(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'postgres': server_version,
+        'tickets_per_participant': args.tickets_per_participant,
+        'results': results
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f'wrote {len(results)} results to {args.output}')
+
+if __name__ == '__main__':
+    main()
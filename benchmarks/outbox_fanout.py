@@ -0,0 +1,64 @@
+'''
+Business: Measure outbox delivery against the local stub: bare sequential requests.post vs pooled concurrent fan-out
+Usage: python benchmarks/outbox_fanout.py [--events 40] [--delay-ms 50]
+Requires: backend/payment/requirements.txt installed
+'''
+import argparse
+import json
+import os
+import time
+
+from stub_functions import StubFunctionHandler, start_stub_server
+from synthetic import load_function_module
+
+def build_events(count):
+    events = []
+    for i in range(count):
+        events.append({'id': 2 * i, 'event_type': 'lottery_registration', 'attempts': 0,
+                       'payload': {'payment_id': i, 'amount': 5000, 'email': f'bench{i}@example.com'}})
+        events.append({'id': 2 * i + 1, 'event_type': 'payment_notification', 'attempts': 0,
+                       'payload': {'action': 'payment_notification', 'payment_id': f'pi_{i}', 'amount': 5000,
+                                   'currency': 'usd', 'payment_type': 'investment'}})
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description='Outbox fan-out latency')
+    parser.add_argument('--events', type=int, default=40, help='payments in the outbox batch')
+    parser.add_argument('--delay-ms', type=float, default=50, help='stub latency per request')
+    args = parser.parse_args()
+    
+    server = start_stub_server(0, args.delay_ms)
+    host, port = server.server_address
+    os.environ['LOTTERY_FUNCTION_URL'] = f'http://{host}:{port}/lottery'
+    os.environ['EMAIL_FUNCTION_URL'] = f'http://{host}:{port}/email'
+    payment = load_function_module('payment')
+    import requests
+    
+    events = build_events(args.events)
+    
+    # Before: one bare requests.post per side effect, one after another
+    started = time.perf_counter()
+    for event in events:
+        url = payment.LOTTERY_FUNCTION_URL if event['event_type'] == 'lottery_registration' else payment.EMAIL_FUNCTION_URL
+        body = dict(event['payload'], action='add_participant') if event['event_type'] == 'lottery_registration' else event['payload']
+        requests.post(url, json=body, headers={'Content-Type': 'application/json'}, timeout=10)
+    sequential_s = time.perf_counter() - started
+    
+    StubFunctionHandler.requests_seen.clear()
+    started = time.perf_counter()
+    outcomes = payment.deliver_outbox_events(events)
+    pooled_s = time.perf_counter() - started
+    
+    print(json.dumps({
+        'events': len(events),
+        'stub_delay_ms': args.delay_ms,
+        'sequential_s': round(sequential_s, 3),
+        'pooled_concurrent_s': round(pooled_s, 3),
+        'pooled_requests': len(StubFunctionHandler.requests_seen),
+        'delivered': sum(1 for error in outcomes.values() if error is None),
+        'http_targets': payment.get_http_target_stats()
+    }, indent=2))
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''
+Business: Compare columnar Parquet/Arrow export of payments with paging through endpoint=payments as JSON
+Usage: DATABASE_URL=postgres://... python benchmarks/payments_export.py [--rows 1000000] [--page-size 50] [--json-rows 200000]
+Notes: payments are generated into a scratch schema that shadows public.payments and is dropped at the end;
+       JSON paging is timed over --json-rows rows and reported as rows per second
+'''
+import argparse
+import io
+import json
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import (
+    apply_payments_indexes, create_synthetic_payments, drop_synthetic_payments, get_database_url,
+    load_function_module, peak_rss_mb
+)
+
+class CountingSink(io.RawIOBase):
+    '''Бинарный приемник, который только считает байты'''
+    def __init__(self):
+        super().__init__()
+        self.bytes_written = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+def page_json(analytics, conn, page_size, max_rows):
+    '''Листает endpoint=payments по курсору, сериализуя каждую страницу в JSON, как это делает handler'''
+    rows = 0
+    body_bytes = 0
+    after = None
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        while rows < max_rows:
+            data = analytics.get_payments_list(cursor, page_size, 0, after=after)
+            body_bytes += len(json.dumps(data))
+            rows += len(data['payments'])
+            after = data['next_cursor']
+            if not data['has_more']:
+                break
+    return rows, body_bytes
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar export vs JSON paging throughput')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--json-rows', type=int, default=200_000, help='rows to page through as JSON')
+    args = parser.parse_args()
+    
+    analytics = load_function_module('analytics')
+    conn = psycopg2.connect(get_database_url())
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            create_synthetic_payments(cursor, args.rows)
+            apply_payments_indexes(cursor, 'V0013__index_payments_keyset.sql')
+            cursor.execute("CREATE TABLE payments_daily_rollup (LIKE public.payments_daily_rollup INCLUDING ALL)")
+            cursor.execute("SELECT public.rebuild_payments_daily_rollup()")
+            cursor.execute("VACUUM ANALYZE payments")
+        
+        started = time.perf_counter()
+        rows, body_bytes = page_json(analytics, conn, args.page_size, args.json_rows)
+        elapsed = time.perf_counter() - started
+        print(json.dumps({
+            'mode': f'json_pages_of_{args.page_size}',
+            'rows': rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_s': round(rows / elapsed),
+            'bytes': body_bytes
+        }))
+        
+        # Named cursors need a transaction; the export runs in one like it does inside handler
+        conn.autocommit = False
+        for export_format in ('parquet', 'arrow'):
+            rss_before = peak_rss_mb()
+            sink = CountingSink()
+            started = time.perf_counter()
+            rows, _ = analytics.write_payments_export(conn, export_format, sink)
+            elapsed = time.perf_counter() - started
+            conn.rollback()
+            print(json.dumps({
+                'mode': export_format,
+                'rows': rows,
+                'seconds': round(elapsed, 2),
+                'rows_per_s': round(rows / elapsed),
+                'bytes': sink.bytes_written,
+                'batch_size': analytics.EXPORT_BATCH_SIZE,
+                'peak_rss_mb_before': round(rss_before, 1),
+                'peak_rss_mb_after': round(peak_rss_mb(), 1)
+            }))
+        
+        # The endpoint buffers each response, so walk it page by page as a client would
+        for export_format in ('parquet', 'arrow'):
+            params = {'endpoint': 'export', 'format': export_format}
+            pages = rows = body_bytes = 0
+            started = time.perf_counter()
+            while True:
+                response = analytics.export_payments_response(conn, params)
+                conn.rollback()
+                pages += 1
+                rows += int(response['headers']['X-Export-Rows'])
+                body_bytes += len(response['body'])
+                if not response['headers']['X-Next-Cursor']:
+                    break
+                params['after'] = response['headers']['X-Next-Cursor']
+            elapsed = time.perf_counter() - started
+            print(json.dumps({
+                'mode': f'{export_format}_endpoint_pages',
+                'pages': pages,
+                'page_rows': analytics.EXPORT_PAGE_ROWS,
+                'rows': rows,
+                'seconds': round(elapsed, 2),
+                'rows_per_s': round(rows / elapsed),
+                'body_bytes': body_bytes,
+                'peak_rss_mb_after': round(peak_rss_mb(), 1)
+            }))
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            drop_synthetic_payments(cursor)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+'''
+Business: Benchmark streaming NDJSON/CSV export of a synthetic lottery round
+Usage: DATABASE_URL=postgres://... python benchmarks/round_export.py [--participants 1000000] [--format ndjson] [--gzip]
+Notes: synthetic data is created inside a transaction that is rolled back at the end
+'''
+import argparse
+import gzip
+import io
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from synthetic import (
+    SYNTHETIC_ROUND_BASE, create_synthetic_round, get_database_url, load_function_module, peak_rss_mb
+)
+
+class CountingSink(io.RawIOBase):
+    '''Бинарный приемник, который только считает байты'''
+    def __init__(self):
+        super().__init__()
+        self.bytes_written = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+def main():
+    parser = argparse.ArgumentParser(description='Round export throughput')
+    parser.add_argument('--participants', type=int, default=1_000_000)
+    parser.add_argument('--tickets', type=int, default=1, help='tickets per participant')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args()
+    
+    lottery = load_function_module('lottery')
+    round_num = SYNTHETIC_ROUND_BASE + 1
+    
+    conn = psycopg2.connect(get_database_url())
+    try:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            create_synthetic_round(cursor, round_num, args.participants, args.tickets)
+            print(f'setup_s={time.perf_counter() - started:.1f}')
+        
+        rss_before = peak_rss_mb()
+        counter = CountingSink()
+        sink = gzip.GzipFile(fileobj=counter, mode='wb') if args.gzip else counter
+        
+        started = time.perf_counter()
+        rows, _ = lottery.write_round_export(conn, round_num, args.format, sink)
+        if args.gzip:
+            sink.close()
+        elapsed = time.perf_counter() - started
+        
+        print(f'rows={rows} format={args.format} gzip={args.gzip} batch={lottery.EXPORT_BATCH_SIZE}')
+        print(f'elapsed_s={elapsed:.2f} rows_per_s={rows / elapsed:,.0f} bytes={counter.bytes_written:,}')
+        print(f'peak_rss_mb_before={rss_before:.1f} peak_rss_mb_after={peak_rss_mb():.1f}')
+        
+        # The endpoint buffers each response, so walk it page by page as a client would
+        params = {'action': 'export', 'round': str(round_num), 'format': args.format, 'gzip': str(args.gzip).lower()}
+        pages = rows = body_bytes = 0
+        started = time.perf_counter()
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            while True:
+                response = lottery.export_round_response(cursor, conn, params)
+                pages += 1
+                rows += int(response['headers']['X-Export-Rows'])
+                body_bytes += len(response['body'])
+                if not response['headers']['X-Next-Cursor']:
+                    break
+                params['after'] = response['headers']['X-Next-Cursor']
+        elapsed = time.perf_counter() - started
+        
+        print(f'endpoint_pages={pages} page_rows={lottery.EXPORT_PAGE_ROWS} rows={rows} body_bytes={body_bytes:,}')
+        print(f'endpoint_elapsed_s={elapsed:.2f} rows_per_s={rows / elapsed:,.0f} peak_rss_mb={peak_rss_mb():.1f}')
+    finally:
+        conn.rollback()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Business: Compare current-round query timings on partitioned vs unpartitioned lottery_participants
+Usage: DATABASE_URL=postgres://... python benchmarks/round_partitioning.py [--rounds 20] [--participants 50000]
+Notes: synthetic rounds and the unpartitioned copy live in a transaction that is rolled back at the end
+'''
+import argparse
+import json
+import statistics
+import time
+
+import psycopg2
+
+from synthetic import SYNTHETIC_ROUND_BASE, create_synthetic_round, get_database_url
+
+QUERIES = {
+    'count_round': "SELECT COUNT(*) FROM {table} WHERE lottery_round = %s",
+    'participants_page': """
+        SELECT id FROM {table}
+        WHERE lottery_round = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT 100
+    """,
+    'draw_weights': """
+        SELECT id, tickets_count FROM {table}
+        WHERE lottery_round = %s AND tickets_count > 0
+        ORDER BY id
+    """
+}
+
+def time_query(cursor, sql, params, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def relations_scanned(cursor, sql, params):
+    cursor.execute('EXPLAIN ' + sql, params)
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+    return plan.count(' on ')
+
+def main():
+    parser = argparse.ArgumentParser(description='Partitioning before/after timings')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--participants', type=int, default=50_000, help='participants per round')
+    parser.add_argument('--repeats', type=int, default=7)
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(get_database_url())
+    try:
+        with conn.cursor() as cursor:
+            first_round = SYNTHETIC_ROUND_BASE + 1
+            for round_num in range(first_round, first_round + args.rounds):
+                create_synthetic_round(cursor, round_num, args.participants, 1)
+            current_round = first_round + args.rounds - 1
+            
+            # "Before": the same rows in a plain table with the pre-partitioning indexes
+            cursor.execute("""
+                CREATE TEMP TABLE plain_lottery_participants AS
+                SELECT * FROM lottery_participants WHERE lottery_round >= %s
+            """, (first_round,))
+            cursor.execute("CREATE INDEX ON plain_lottery_participants(lottery_round)")
+            cursor.execute("CREATE INDEX ON plain_lottery_participants(lottery_round, created_at DESC, id DESC)")
+            cursor.execute("ANALYZE plain_lottery_participants")
+            
+            for name, template in QUERIES.items():
+                result = {'query': name, 'rounds': args.rounds, 'participants_per_round': args.participants}
+                for label, table in (('before', 'plain_lottery_participants'), ('after', 'lottery_participants')):
+                    sql = template.format(table=table)
+                    result[f'{label}_ms'] = round(time_query(cursor, sql, (current_round,), args.repeats), 3)
+                    result[f'{label}_relations'] = relations_scanned(cursor, sql, (current_round,))
+                print(json.dumps(result))
+    finally:
+        conn.rollback()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
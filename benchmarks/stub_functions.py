@@ -0,0 +1,72 @@
+'''
+Business: Local stub for the lottery and email functions, used instead of functions.poehali.dev
+Usage: python benchmarks/stub_functions.py [--port 8765] [--delay-ms 50]
+       then LOTTERY_FUNCTION_URL=http://127.0.0.1:8765/lottery EMAIL_FUNCTION_URL=http://127.0.0.1:8765/email
+'''
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubFunctionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real functions
+    delay_seconds = 0.0
+    fail_paths = set()
+    requests_seen = []
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', '0'))) or b'{}')
+        StubFunctionHandler.requests_seen.append((self.path, body))
+        time.sleep(self.delay_seconds)
+        
+        if self.path in self.fail_paths:
+            self.respond(500, {'error': 'Stub failure'})
+        elif body.get('action') == 'add_participants':
+            self.respond(200, {
+                'success': True,
+                'results': [
+                    {'payment_id': item.get('payment_id'), 'status': 'added'}
+                    for item in body.get('payments', [])
+                ]
+            })
+        elif body.get('action') == 'add_participant':
+            self.respond(200, {'success': True, 'lottery_round': 1})
+        else:
+            self.respond(200, {'success': True})
+    
+    def respond(self, status, data):
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port: int = 0, delay_ms: float = 0.0) -> ThreadingHTTPServer:
+    '''Запускает заглушку в фоновом потоке; адрес — server.server_address'''
+    StubFunctionHandler.delay_seconds = delay_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubFunctionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub lottery/email functions')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay-ms', type=float, default=50)
+    args = parser.parse_args()
+    
+    server = start_stub_server(args.port, args.delay_ms)
+    host, port = server.server_address
+    print(f'LOTTERY_FUNCTION_URL=http://{host}:{port}/lottery')
+    print(f'EMAIL_FUNCTION_URL=http://{host}:{port}/email')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+'''
+Business: Shared helpers for benchmarks that need synthetic lottery data in a local Postgres
+Usage: imported by the benchmark scripts in this directory
+'''
+import importlib.util
+import os
+import resource
+import sys
+
+BACKEND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_migrations')
+
+# Synthetic rounds live far above real round numbers so they never collide
+SYNTHETIC_ROUND_BASE = 900000
+
+# Synthetic payments tables are created in this schema and dropped afterwards
+SYNTHETIC_SCHEMA = 'bench_synthetic'
+
+def load_function_module(function_name: str):
+    '''Загружает index.py функции из backend/<function_name>'''
+    path = os.path.join(BACKEND_PATH, function_name, 'index.py')
+    spec = importlib.util.spec_from_file_location(f'{function_name}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def get_database_url() -> str:
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL must point at a local Postgres with db_migrations applied')
+    return database_url
+
+def create_synthetic_round(cursor, round_num: int, participants: int, tickets_per_participant: int,
+                           is_active: bool = False) -> None:
+    '''Создает раунд с participants участниками по tickets_per_participant билетов'''
+    amount = tickets_per_participant * 1000  # 1 ticket per $10
+    cursor.execute("""
+        INSERT INTO lottery (
+            total_investment_amount, prize_fund_1, prize_fund_2, prize_fund_3,
+            total_participants, current_round, is_active
+        ) VALUES (0, 0, 0, 0, 0, %s, %s)
+    """, (round_num, is_active))
+    cursor.execute("SELECT ensure_lottery_round_partitions(%s)", (round_num,))
+    cursor.execute(
+        "SELECT setval(%s, %s, false)",
+        (f'lottery_tickets_r{round_num}_seq', participants * tickets_per_participant)
+    )
+    
+    cursor.execute("""
+        WITH new_payments AS (
+            INSERT INTO payments (
+                payment_intent_id, amount, currency, payment_type, customer_email, status
+            )
+            SELECT 'pi_bench_' || %(round)s || '_' || g, %(amount)s, 'usd', 'investment',
+                   'bench' || g || '@example.com', 'succeeded'
+            FROM generate_series(1, %(participants)s) g
+            RETURNING id, amount, customer_email
+        )
+        INSERT INTO lottery_participants (
+            payment_id, lottery_round, participant_email, investment_amount, tickets_count
+        )
+        SELECT id, %(round)s, customer_email, amount, %(tickets)s
+        FROM new_payments
+    """, {'round': round_num, 'amount': amount, 'participants': participants, 'tickets': tickets_per_participant})
+    
+    cursor.execute("""
+        INSERT INTO lottery_tickets (lottery_round, ticket_number, participant_id)
+        SELECT lp.lottery_round, 'BENCH-' || lp.id || '-' || t, lp.id
+        FROM lottery_participants lp
+        CROSS JOIN generate_series(1, %s) t
+        WHERE lp.lottery_round = %s
+    """, (tickets_per_participant, round_num))
+    
+    cursor.execute("ANALYZE lottery_participants")
+    cursor.execute("ANALYZE lottery_tickets")
+
+def create_synthetic_payments(cursor, rows: int, days: int = 730) -> None:
+    '''Создает payments в схеме SYNTHETIC_SCHEMA с rows платежами за последние days дней'''
+    # The schema shadows public.payments via search_path, so function code queries it unchanged.
+    # A regular (unlogged) table rather than a temp one keeps parallel scans available.
+    drop_synthetic_payments(cursor)
+    cursor.execute(f"CREATE SCHEMA {SYNTHETIC_SCHEMA}")
+    cursor.execute(f"SET search_path = {SYNTHETIC_SCHEMA}, public")
+    cursor.execute("CREATE UNLOGGED TABLE payments (LIKE public.payments INCLUDING DEFAULTS)")
+    cursor.execute("""
+        INSERT INTO payments (
+            id, payment_intent_id, amount, currency, payment_type, status, customer_email, created_at
+        )
+        SELECT
+            g,
+            'pi_syn_' || g,
+            500 + (random() * 99500)::int,
+            'usd',
+            CASE WHEN random() < 0.6 THEN 'donation' ELSE 'investment' END,
+            CASE
+                WHEN r < 0.85 THEN 'succeeded'
+                WHEN r < 0.90 THEN 'failed'
+                ELSE 'requires_payment_method'
+            END,
+            'syn' || g || '@example.com',
+            NOW() - random() * %s * INTERVAL '1 day'
+        FROM generate_series(1, %s) g, LATERAL (SELECT random() + g * 0 AS r) s
+    """, (days, rows))
+    cursor.execute("ALTER TABLE payments ADD PRIMARY KEY (id)")
+
+def drop_synthetic_payments(cursor) -> None:
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SYNTHETIC_SCHEMA} CASCADE")
+    cursor.execute("RESET search_path")
+
+def apply_payments_indexes(cursor, migration: str) -> None:
+    '''Выполняет CREATE INDEX из миграции над синтетической таблицей payments'''
+    path = os.path.join(MIGRATIONS_PATH, migration)
+    with open(path) as migration_file:
+        statements = [statement.strip() for statement in migration_file.read().split(';')]
+    for statement in statements:
+        body = '\n'.join(line for line in statement.splitlines() if not line.startswith('--'))
+        if body.startswith('CREATE INDEX'):
+            cursor.execute(body)
+
+def peak_rss_mb() -> float:
+    '''Пиковый RSS процесса в мегабайтах'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,44 @@
+'''
+Business: Benchmark lottery ticket number generation throughput
+Usage: python benchmarks/ticket_generation.py [--count 1000000] [--round 1]
+Requires: backend/lottery/requirements.txt installed (the module imports psycopg2)
+'''
+import argparse
+import importlib.util
+import os
+import time
+
+LOTTERY_PATH = os.path.join(os.path.dirname(__file__), '..', 'backend', 'lottery', 'index.py')
+
+def load_lottery_module():
+    spec = importlib.util.spec_from_file_location('lottery_index', LOTTERY_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def main():
+    parser = argparse.ArgumentParser(description='Ticket generation throughput')
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--round', type=int, default=1)
+    parser.add_argument('--batch', type=int, default=10_000, help='tickets per allocated sequence block')
+    args = parser.parse_args()
+    
+    lottery = load_lottery_module()
+    
+    # Permutation tables are built once per round and cached across invocations
+    started = time.perf_counter()
+    lottery.get_ticket_permutation_tables(args.round)
+    setup_seconds = time.perf_counter() - started
+    
+    seen = set()
+    started = time.perf_counter()
+    for start in range(0, args.count, args.batch):
+        seen.update(lottery.generate_ticket_numbers(args.round, range(start, min(start + args.batch, args.count))))
+    elapsed = time.perf_counter() - started
+    
+    print(f'tables_setup_s={setup_seconds:.3f}')
+    print(f'tickets={args.count} elapsed_s={elapsed:.3f} tickets_per_s={args.count / elapsed:,.0f}')
+    print(f'unique={len(seen)} duplicates={args.count - len(seen)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+-- Create lottery tickets table: one row per ticket instead of comma-joined TEXT
+CREATE TABLE lottery_tickets (
+    id BIGSERIAL PRIMARY KEY,
+    lottery_round INTEGER NOT NULL,
+    ticket_number VARCHAR(50) NOT NULL,
+    participant_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (participant_id) REFERENCES lottery_participants(id),
+    UNIQUE (lottery_round, ticket_number)
+);
+
+-- Per-participant ticket count, kept next to the participant row
+ALTER TABLE lottery_participants ADD COLUMN tickets_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill tickets from the legacy ticket_numbers column.
+-- Duplicate codes within a round keep the earliest participant as owner.
+INSERT INTO lottery_tickets (lottery_round, ticket_number, participant_id, created_at)
+SELECT lp.lottery_round, btrim(t.ticket), lp.id, lp.created_at
+FROM lottery_participants lp
+CROSS JOIN LATERAL unnest(string_to_array(lp.ticket_numbers, ',')) AS t(ticket)
+WHERE lp.ticket_numbers IS NOT NULL
+AND btrim(t.ticket) <> ''
+ORDER BY lp.id
+ON CONFLICT (lottery_round, ticket_number) DO NOTHING;
+
+UPDATE lottery_participants lp
+SET tickets_count = c.tickets_count
+FROM (
+    SELECT participant_id, COUNT(*) AS tickets_count
+    FROM lottery_tickets
+    GROUP BY participant_id
+) c
+WHERE c.participant_id = lp.id;
+
+-- Create indexes
+CREATE INDEX idx_lottery_tickets_participant ON lottery_tickets(participant_id);
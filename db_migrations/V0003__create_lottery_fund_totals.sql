@@ -0,0 +1,53 @@
+-- Running prize-fund totals kept current by a trigger on payments,
+-- so reading lottery status no longer scans the payments table
+CREATE TABLE lottery_fund_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_investment_amount BIGINT NOT NULL DEFAULT 0,
+    total_investors INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Block concurrent payment writes while the totals are seeded and the trigger is installed
+LOCK TABLE payments IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO lottery_fund_totals (id, total_investment_amount, total_investors)
+SELECT 1, COALESCE(SUM(amount), 0), COUNT(*)
+FROM payments
+WHERE payment_type = 'investment'
+AND status = 'succeeded';
+
+CREATE OR REPLACE FUNCTION apply_lottery_fund_delta() RETURNS TRIGGER AS $$
+DECLARE
+    amount_delta BIGINT := 0;
+    investors_delta INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        IF OLD.payment_type = 'investment' AND OLD.status = 'succeeded' THEN
+            amount_delta := amount_delta - OLD.amount;
+            investors_delta := investors_delta - 1;
+        END IF;
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        IF NEW.payment_type = 'investment' AND NEW.status = 'succeeded' THEN
+            amount_delta := amount_delta + NEW.amount;
+            investors_delta := investors_delta + 1;
+        END IF;
+    END IF;
+
+    IF amount_delta <> 0 OR investors_delta <> 0 THEN
+        UPDATE lottery_fund_totals
+        SET
+            total_investment_amount = total_investment_amount + amount_delta,
+            total_investors = total_investors + investors_delta,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_payments_lottery_fund
+AFTER INSERT OR DELETE OR UPDATE OF amount, status, payment_type ON payments
+FOR EACH ROW EXECUTE FUNCTION apply_lottery_fund_delta();
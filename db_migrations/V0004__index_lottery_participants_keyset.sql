@@ -0,0 +1,6 @@
+-- Keyset pagination of a round's participants orders by (created_at, id)
+UPDATE lottery_participants SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE lottery_participants ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX idx_lottery_participants_round_created
+    ON lottery_participants(lottery_round, created_at DESC, id DESC);
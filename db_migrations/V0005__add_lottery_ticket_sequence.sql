@@ -0,0 +1,8 @@
+-- Per-round ticket sequence: ticket codes are a keyed permutation of these positions
+ALTER TABLE lottery ADD COLUMN tickets_issued BIGINT NOT NULL DEFAULT 0;
+
+UPDATE lottery l
+SET tickets_issued = (
+    SELECT COUNT(*) FROM lottery_tickets t
+    WHERE t.lottery_round = l.current_round
+);
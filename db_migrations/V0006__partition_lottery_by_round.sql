@@ -0,0 +1,91 @@
+-- Partition lottery_participants and lottery_winners by lottery_round (one LIST partition per round).
+-- Primary keys must include the partition key, so foreign keys to participants become (participant_id, lottery_round).
+
+-- Creates the partitions of both tables for a round; called for every round opened by the draw
+CREATE OR REPLACE FUNCTION ensure_lottery_round_partitions(round_num INTEGER) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF lottery_participants FOR VALUES IN (%s)',
+        'lottery_participants_r' || round_num, round_num
+    );
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF lottery_winners FOR VALUES IN (%s)',
+        'lottery_winners_r' || round_num, round_num
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE lottery_participants RENAME TO lottery_participants_legacy;
+ALTER TABLE lottery_winners RENAME TO lottery_winners_legacy;
+
+CREATE TABLE lottery_participants (
+    id INTEGER NOT NULL DEFAULT nextval('lottery_participants_id_seq'),
+    payment_id INTEGER NOT NULL,
+    lottery_round INTEGER NOT NULL,
+    participant_email VARCHAR(255),
+    investment_amount INTEGER NOT NULL,
+    ticket_numbers TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    tickets_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (id, lottery_round),
+    FOREIGN KEY (payment_id) REFERENCES payments(id)
+) PARTITION BY LIST (lottery_round);
+
+CREATE TABLE lottery_winners (
+    id INTEGER NOT NULL DEFAULT nextval('lottery_winners_id_seq'),
+    lottery_round INTEGER NOT NULL,
+    participant_id INTEGER NOT NULL,
+    prize_position INTEGER NOT NULL CHECK (prize_position IN (1, 2, 3)),
+    prize_amount INTEGER NOT NULL,
+    winning_ticket VARCHAR(50),
+    claimed BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, lottery_round),
+    FOREIGN KEY (participant_id, lottery_round) REFERENCES lottery_participants(id, lottery_round)
+) PARTITION BY LIST (lottery_round);
+
+-- Create partitions for every known round plus the active one
+SELECT ensure_lottery_round_partitions(r.lottery_round)
+FROM (
+    SELECT lottery_round FROM lottery_participants_legacy
+    UNION
+    SELECT lottery_round FROM lottery_winners_legacy
+    UNION
+    SELECT current_round FROM lottery
+) r;
+
+INSERT INTO lottery_participants (
+    id, payment_id, lottery_round, participant_email, investment_amount,
+    ticket_numbers, created_at, tickets_count
+)
+SELECT
+    id, payment_id, lottery_round, participant_email, investment_amount,
+    ticket_numbers, created_at, tickets_count
+FROM lottery_participants_legacy;
+
+INSERT INTO lottery_winners (
+    id, lottery_round, participant_id, prize_position, prize_amount,
+    winning_ticket, claimed, created_at
+)
+SELECT
+    id, lottery_round, participant_id, prize_position, prize_amount,
+    winning_ticket, claimed, created_at
+FROM lottery_winners_legacy;
+
+-- Keep the id sequences alive once the legacy tables are dropped
+ALTER SEQUENCE lottery_participants_id_seq OWNED BY lottery_participants.id;
+ALTER SEQUENCE lottery_winners_id_seq OWNED BY lottery_winners.id;
+
+ALTER TABLE lottery_tickets DROP CONSTRAINT lottery_tickets_participant_id_fkey;
+DROP TABLE lottery_winners_legacy;
+DROP TABLE lottery_participants_legacy;
+
+ALTER TABLE lottery_tickets
+    ADD CONSTRAINT lottery_tickets_participant_round_fkey
+    FOREIGN KEY (participant_id, lottery_round) REFERENCES lottery_participants(id, lottery_round);
+
+-- Create indexes (the per-round indexes are replaced by partition pruning)
+CREATE INDEX idx_lottery_participants_payment ON lottery_participants(payment_id);
+CREATE INDEX idx_lottery_participants_round_created
+    ON lottery_participants(lottery_round, created_at DESC, id DESC);
+CREATE INDEX idx_lottery_winners_participant ON lottery_winners(participant_id);
@@ -0,0 +1,15 @@
+-- Per-round participant and ticket totals, snapshotted by the draw for the winners history
+ALTER TABLE lottery ADD COLUMN round_participants INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE lottery ADD COLUMN round_tickets BIGINT NOT NULL DEFAULT 0;
+
+UPDATE lottery l
+SET
+    round_participants = totals.participants,
+    round_tickets = totals.tickets
+FROM (
+    SELECT lottery_round, COUNT(*) AS participants, SUM(tickets_count) AS tickets
+    FROM lottery_participants
+    GROUP BY lottery_round
+) totals
+WHERE totals.lottery_round = l.current_round
+AND l.is_active = false;
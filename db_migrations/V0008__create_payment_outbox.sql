@@ -0,0 +1,19 @@
+-- Outbox for side effects of a saved payment (lottery registration, email notification).
+-- Rows are written in the payment's transaction and delivered later by the drain worker.
+CREATE TABLE payment_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    payment_id INTEGER NOT NULL,
+    event_type VARCHAR(50) NOT NULL CHECK (event_type IN ('lottery_registration', 'payment_notification')),
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'delivered', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TIMESTAMP WITH TIME ZONE,
+    FOREIGN KEY (payment_id) REFERENCES payments(id)
+);
+
+-- Create indexes
+CREATE INDEX idx_payment_outbox_pending ON payment_outbox(next_attempt_at) WHERE status = 'pending';
+CREATE INDEX idx_payment_outbox_payment ON payment_outbox(payment_id);
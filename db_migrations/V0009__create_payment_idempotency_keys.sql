@@ -0,0 +1,12 @@
+-- Idempotency keys for payment creation: a retried POST with the same
+-- Idempotency-Key header replays the stored response instead of creating a new intent.
+CREATE TABLE payment_idempotency_keys (
+    idempotency_key VARCHAR(255) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    payment_intent_id VARCHAR(255) NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create indexes
+CREATE INDEX idx_payment_idempotency_keys_created ON payment_idempotency_keys(created_at);
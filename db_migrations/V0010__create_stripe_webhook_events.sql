@@ -0,0 +1,21 @@
+-- Verified Stripe webhook events, buffered until the applier moves payment statuses in bulk.
+-- The Stripe event id is the primary key, so redelivered events are dropped on insert.
+CREATE TABLE stripe_webhook_events (
+    event_id VARCHAR(255) PRIMARY KEY,
+    event_type VARCHAR(100) NOT NULL,
+    payment_intent_id VARCHAR(255) NOT NULL,
+    intent_status VARCHAR(50) NOT NULL,
+    event_created TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'applied', 'ignored')),
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    applied_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Creation time of the last webhook event applied to a payment; older events are out of order
+ALTER TABLE payments ADD COLUMN status_event_at TIMESTAMP WITH TIME ZONE;
+
+-- Create indexes
+CREATE INDEX idx_stripe_webhook_events_pending ON stripe_webhook_events(received_at) WHERE status = 'pending';
+CREATE INDEX idx_stripe_webhook_events_intent ON stripe_webhook_events(payment_intent_id);
+-- The bulk status update joins payments by intent id
+CREATE INDEX IF NOT EXISTS idx_payments_payment_intent_id ON payments(payment_intent_id);
@@ -0,0 +1,11 @@
+-- Keyset pagination of the analytics payments list orders by (created_at, id)
+UPDATE payments SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE payments ALTER COLUMN created_at SET NOT NULL;
+
+CREATE INDEX idx_payments_keyset
+    ON payments(created_at DESC, id DESC)
+    WHERE status <> 'failed';
+
+CREATE INDEX idx_payments_type_keyset
+    ON payments(payment_type, created_at DESC, id DESC)
+    WHERE status <> 'failed';
@@ -0,0 +1,84 @@
+-- Mergeable amount distribution per rollup row: a DDSketch with 1% relative accuracy.
+-- amount_sketch maps bucket index -> count; bucket i holds amounts in (gamma^(i-1), gamma^i]
+-- with gamma = (1 + 0.01) / (1 - 0.01). Sketches for any day range merge by adding counts.
+ALTER TABLE payments_daily_rollup ADD COLUMN amount_sketch JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+CREATE OR REPLACE FUNCTION payment_amount_sketch_bucket(amount BIGINT) RETURNS INTEGER AS $$
+    SELECT CASE WHEN amount > 0 THEN CEIL(LN(amount::double precision) / LN(1.01 / 0.99))::integer END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION payment_amount_sketch_add(sketch JSONB, amount BIGINT, delta INTEGER) RETURNS JSONB AS $$
+    SELECT CASE
+        WHEN b IS NULL THEN sketch
+        WHEN COALESCE((sketch ->> b)::bigint, 0) + delta <= 0 THEN sketch - b
+        ELSE jsonb_set(sketch, ARRAY[b], to_jsonb(COALESCE((sketch ->> b)::bigint, 0) + delta))
+    END
+    FROM (SELECT payment_amount_sketch_bucket(amount)::text AS b) bucket
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION apply_payments_daily_rollup_delta() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.created_at IS NOT NULL THEN
+        UPDATE payments_daily_rollup
+        SET
+            payments_count = payments_count - 1,
+            amount_sum = amount_sum - OLD.amount,
+            amount_sketch = payment_amount_sketch_add(amount_sketch, OLD.amount, -1),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE day = (OLD.created_at AT TIME ZONE 'UTC')::date
+        AND payment_type = OLD.payment_type
+        AND status = OLD.status;
+    END IF;
+
+    IF TG_OP <> 'DELETE' AND NEW.created_at IS NOT NULL THEN
+        INSERT INTO payments_daily_rollup (day, payment_type, status, payments_count, amount_sum, amount_sketch)
+        VALUES (
+            (NEW.created_at AT TIME ZONE 'UTC')::date, NEW.payment_type, NEW.status, 1, NEW.amount,
+            payment_amount_sketch_add('{}'::jsonb, NEW.amount, 1)
+        )
+        ON CONFLICT (day, payment_type, status) DO UPDATE SET
+            payments_count = payments_daily_rollup.payments_count + 1,
+            amount_sum = payments_daily_rollup.amount_sum + EXCLUDED.amount_sum,
+            amount_sketch = payment_amount_sketch_add(payments_daily_rollup.amount_sketch, NEW.amount, 1),
+            updated_at = CURRENT_TIMESTAMP;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION rebuild_payments_daily_rollup(from_day DATE DEFAULT NULL, to_day DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    rebuilt_rows INTEGER;
+BEGIN
+    -- Block concurrent payment writes so the trigger cannot interleave with the recompute
+    LOCK TABLE payments IN SHARE ROW EXCLUSIVE MODE;
+
+    DELETE FROM payments_daily_rollup
+    WHERE (from_day IS NULL OR day >= from_day)
+    AND (to_day IS NULL OR day <= to_day);
+
+    INSERT INTO payments_daily_rollup (day, payment_type, status, payments_count, amount_sum, amount_sketch)
+    SELECT
+        day, payment_type, status, SUM(payments_count), SUM(amount_sum),
+        COALESCE(jsonb_object_agg(bucket, payments_count) FILTER (WHERE bucket IS NOT NULL), '{}'::jsonb)
+    FROM (
+        SELECT
+            (created_at AT TIME ZONE 'UTC')::date AS day, payment_type, status,
+            payment_amount_sketch_bucket(amount) AS bucket,
+            COUNT(*) AS payments_count, SUM(amount) AS amount_sum
+        FROM payments
+        WHERE created_at IS NOT NULL
+        AND (from_day IS NULL OR created_at >= from_day::timestamp AT TIME ZONE 'UTC')
+        AND (to_day IS NULL OR created_at < (to_day + 1)::timestamp AT TIME ZONE 'UTC')
+        GROUP BY 1, 2, 3, 4
+    ) buckets
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS rebuilt_rows = ROW_COUNT;
+
+    RETURN rebuilt_rows;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_payments_daily_rollup();
@@ -0,0 +1,32 @@
+-- Ticket positions come from one sequence per round instead of the lottery.tickets_issued counter,
+-- so registrations no longer update (and lock until commit) the active lottery row.
+-- Gaps left by rolled back or cached values are harmless: the permutation only needs unique positions.
+-- MAXVALUE is the size of the "LT-AAA000" code space minus one.
+CREATE OR REPLACE FUNCTION ensure_lottery_round_partitions(round_num INTEGER) RETURNS VOID AS $$
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF lottery_participants FOR VALUES IN (%s)',
+        'lottery_participants_r' || round_num, round_num
+    );
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF lottery_winners FOR VALUES IN (%s)',
+        'lottery_winners_r' || round_num, round_num
+    );
+    EXECUTE format(
+        'CREATE SEQUENCE IF NOT EXISTS %I AS BIGINT MINVALUE 0 MAXVALUE 17575999 START 0 CACHE 100',
+        'lottery_tickets_r' || round_num || '_seq'
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Continue every known round's sequence where its counter stopped
+SELECT
+    ensure_lottery_round_partitions(l.current_round),
+    setval('lottery_tickets_r' || l.current_round || '_seq', l.tickets_issued, false)
+FROM (
+    SELECT current_round, MAX(tickets_issued) AS tickets_issued
+    FROM lottery
+    GROUP BY current_round
+) l;
+
+ALTER TABLE lottery DROP COLUMN tickets_issued;
@@ -0,0 +1,40 @@
+-- Round partitions and ticket sequences are created ahead of time instead of by the draw and status requests.
+-- CREATE TABLE ... PARTITION OF locks lottery_participants/lottery_winners (and payments through the foreign key)
+-- and needs the CREATE privilege, so it belongs to migrations and maintenance, not to request paths.
+
+-- Safety net: rows of a round beyond the prepared horizon land here instead of failing.
+-- Such a round keeps living in the default partition; queries stay correct, only pruning is lost.
+CREATE TABLE IF NOT EXISTS lottery_participants_default PARTITION OF lottery_participants DEFAULT;
+CREATE TABLE IF NOT EXISTS lottery_winners_default PARTITION OF lottery_winners DEFAULT;
+
+-- Fallback ticket positions for a round without its own sequence; CYCLE is safe because
+-- insert_lottery_tickets reissues any number that collides within the round
+CREATE SEQUENCE IF NOT EXISTS lottery_tickets_default_seq AS BIGINT MINVALUE 0 MAXVALUE 17575999 START 0 CYCLE CACHE 100;
+
+-- Maintenance step: prepares the active round and the next rounds_ahead rounds.
+-- Run after every draw or on a schedule, e.g. psql -c "SELECT prepare_lottery_rounds()".
+CREATE OR REPLACE FUNCTION prepare_lottery_rounds(rounds_ahead INTEGER DEFAULT 12) RETURNS INTEGER AS $$
+DECLARE
+    first_round INTEGER;
+    round_num INTEGER;
+    prepared INTEGER := 0;
+BEGIN
+    SELECT COALESCE(MAX(current_round), 1) INTO first_round FROM lottery;
+
+    FOR round_num IN first_round .. first_round + rounds_ahead LOOP
+        CONTINUE WHEN to_regclass('lottery_participants_r' || round_num) IS NOT NULL;
+        -- A list partition cannot be created while the default partition holds rows for its value
+        IF EXISTS (SELECT 1 FROM lottery_participants_default WHERE lottery_round = round_num)
+            OR EXISTS (SELECT 1 FROM lottery_winners_default WHERE lottery_round = round_num) THEN
+            RAISE NOTICE 'lottery round % already has rows in the default partitions', round_num;
+            CONTINUE;
+        END IF;
+        PERFORM ensure_lottery_round_partitions(round_num);
+        prepared := prepared + 1;
+    END LOOP;
+
+    RETURN prepared;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT prepare_lottery_rounds();
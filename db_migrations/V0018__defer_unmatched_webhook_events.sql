@@ -0,0 +1,8 @@
+-- Events whose intent has no payments row yet are retried with backoff instead of being
+-- picked first on every run; the applier selects by next_attempt_at, not received_at.
+ALTER TABLE stripe_webhook_events
+    ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+DROP INDEX IF EXISTS idx_stripe_webhook_events_pending;
+CREATE INDEX idx_stripe_webhook_events_pending ON stripe_webhook_events(next_attempt_at) WHERE status = 'pending';
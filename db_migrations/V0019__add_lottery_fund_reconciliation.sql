@@ -0,0 +1,50 @@
+-- Compares the trigger-maintained prize-fund counters with a full recompute over payments.
+-- A maintenance step, not an endpoint: psql -c "SELECT * FROM reconcile_lottery_fund_totals()",
+-- or reconcile_lottery_fund_totals(true) to overwrite the counters when they drifted.
+CREATE OR REPLACE FUNCTION reconcile_lottery_fund_totals(repair BOOLEAN DEFAULT false)
+RETURNS TABLE (
+    in_sync BOOLEAN,
+    repaired BOOLEAN,
+    counter_investment_amount BIGINT,
+    actual_investment_amount BIGINT,
+    counter_investors INTEGER,
+    actual_investors INTEGER
+) AS $$
+BEGIN
+    -- Only a repair blocks payment writes: the counters must not move between the recompute and the overwrite.
+    -- A plain check reads counters and payments in one statement, so both come from the same snapshot.
+    IF repair THEN
+        LOCK TABLE payments IN SHARE ROW EXCLUSIVE MODE;
+    END IF;
+
+    SELECT
+        COALESCE(f.total_investment_amount, 0),
+        a.total_invested,
+        COALESCE(f.total_investors, 0),
+        a.total_investors,
+        f.id IS NOT NULL
+            AND f.total_investment_amount = a.total_invested
+            AND f.total_investors = a.total_investors
+    INTO counter_investment_amount, actual_investment_amount, counter_investors, actual_investors, in_sync
+    FROM (
+        SELECT COALESCE(SUM(amount), 0)::bigint as total_invested, COUNT(*)::integer as total_investors
+        FROM payments
+        WHERE payment_type = 'investment'
+        AND status = 'succeeded'
+    ) a
+    LEFT JOIN lottery_fund_totals f ON f.id = 1;
+
+    repaired := false;
+    IF repair AND NOT in_sync THEN
+        INSERT INTO lottery_fund_totals (id, total_investment_amount, total_investors)
+        VALUES (1, actual_investment_amount, actual_investors)
+        ON CONFLICT (id) DO UPDATE SET
+            total_investment_amount = EXCLUDED.total_investment_amount,
+            total_investors = EXCLUDED.total_investors,
+            updated_at = CURRENT_TIMESTAMP;
+        repaired := true;
+    END IF;
+
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
@@ -37,8 +37,11 @@ interface PaymentsResponse {
   limit: number;
   offset: number;
   has_more: boolean;
+  next_cursor: string | null;
 }
 
+const PAYMENTS_PAGE_SIZE = 20;
+
 interface ChartData {
   daily_payments: Array<{
     date: string;
@@ -62,6 +65,8 @@ const Dashboard: React.FC = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [currentPage, setCurrentPage] = useState(0);
+  // Cursor that opens each visited page; "back" reuses it instead of an OFFSET scan
+  const [pageCursors, setPageCursors] = useState<Array<string | null>>([null]);
   const [selectedType, setSelectedType] = useState<string>('all');
 
   const API_URL = 'https://functions.poehali.dev/42c57359-64f7-453e-95b5-c07175504edf';
@@ -78,7 +83,8 @@ const Dashboard: React.FC = () => {
       }
 
       // Fetch payments
-      const paymentsUrl = `${API_URL}?endpoint=payments&limit=20&offset=${currentPage * 20}${selectedType !== 'all' ? `&type=${selectedType}` : ''}`;
+      const pageCursor = pageCursors[currentPage];
+      const paymentsUrl = `${API_URL}?endpoint=payments&limit=${PAYMENTS_PAGE_SIZE}${pageCursor ? `&after=${encodeURIComponent(pageCursor)}` : ''}${selectedType !== 'all' ? `&type=${selectedType}` : ''}`;
       const paymentsResponse = await fetch(paymentsUrl);
       if (paymentsResponse.ok) {
         const paymentsData = await paymentsResponse.json();
@@ -104,6 +110,18 @@ const Dashboard: React.FC = () => {
     fetchData();
   }, [currentPage, selectedType]);
 
+  const selectType = (type: string) => {
+    setSelectedType(type);
+    setPageCursors([null]);
+    setCurrentPage(0);
+  };
+
+  const goToNextPage = () => {
+    if (!payments?.next_cursor) return;
+    setPageCursors([...pageCursors.slice(0, currentPage + 1), payments.next_cursor]);
+    setCurrentPage(currentPage + 1);
+  };
+
   const formatCurrency = (amount: number) => {
     return new Intl.NumberFormat('ru-RU', {
       style: 'currency',
@@ -273,30 +291,21 @@ const Dashboard: React.FC = () => {
                     <Button
                       variant={selectedType === 'all' ? 'default' : 'outline'}
                       size="sm"
-                      onClick={() => {
-                        setSelectedType('all');
-                        setCurrentPage(0);
-                      }}
+                      onClick={() => selectType('all')}
                     >
                       Все
                     </Button>
                     <Button
                       variant={selectedType === 'donation' ? 'default' : 'outline'}
                       size="sm"
-                      onClick={() => {
-                        setSelectedType('donation');
-                        setCurrentPage(0);
-                      }}
+                      onClick={() => selectType('donation')}
                     >
                       Пожертвования
                     </Button>
                     <Button
                       variant={selectedType === 'investment' ? 'default' : 'outline'}
                       size="sm"
-                      onClick={() => {
-                        setSelectedType('investment');
-                        setCurrentPage(0);
-                      }}
+                      onClick={() => selectType('investment')}
                     >
                       Инвестиции
                     </Button>
@@ -345,7 +354,7 @@ const Dashboard: React.FC = () => {
                     {/* Pagination */}
                     <div className="flex justify-between items-center mt-6">
                       <p className="text-sm text-gray-600">
-                        Показаны {currentPage * 20 + 1}-{Math.min((currentPage + 1) * 20, payments.total)} из {payments.total}
+                        Показаны {currentPage * PAYMENTS_PAGE_SIZE + 1}-{currentPage * PAYMENTS_PAGE_SIZE + payments.payments.length} из {payments.total}
                       </p>
                       <div className="flex gap-2">
                         <Button
@@ -360,8 +369,8 @@ const Dashboard: React.FC = () => {
                         <Button
                           variant="outline"
                           size="sm"
-                          onClick={() => setCurrentPage(currentPage + 1)}
-                          disabled={!payments.has_more}
+                          onClick={goToNextPage}
+                          disabled={!payments.next_cursor}
                         >
                           Вперед
                           <Icon name="ChevronRight" size={16} />
@@ -28,6 +28,17 @@ interface Participant {
   joined_at: string;
 }
 
+interface ParticipantsPage {
+  round: number;
+  participants: Participant[];
+  count: number;
+  has_more: boolean;
+  next_cursor: string | null;
+}
+
+// Largest page the participants endpoint serves (MAX_PARTICIPANTS_PAGE_SIZE)
+const PARTICIPANTS_PAGE_LIMIT = 1000;
+
 interface Winner {
   position: number;
   prize_usd: number;
@@ -59,6 +70,24 @@ const LotteryDraw: React.FC = () => {
 
   const API_URL = 'https://functions.poehali.dev/84895621-7397-4c97-a683-4c67fcfd0bad';
 
+  const fetchAllParticipants = async (round: number): Promise<Participant[]> => {
+    const allParticipants: Participant[] = [];
+    let after: string | null = null;
+    
+    do {
+      const cursorParam = after ? `&after=${encodeURIComponent(after)}` : '';
+      const response = await fetch(`${API_URL}?action=participants&round=${round}&limit=${PARTICIPANTS_PAGE_LIMIT}${cursorParam}`);
+      if (!response.ok) {
+        throw new Error(`Participants request failed: ${response.status}`);
+      }
+      const page: ParticipantsPage = await response.json();
+      allParticipants.push(...(page.participants || []));
+      after = page.has_more ? page.next_cursor : null;
+    } while (after);
+    
+    return allParticipants;
+  };
+
   const fetchLotteryData = async () => {
     try {
       setLoading(true);
@@ -69,12 +98,8 @@ const LotteryDraw: React.FC = () => {
         const statusData = await statusResponse.json();
         setLotteryStatus(statusData);
         
-        // Fetch participants
-        const participantsResponse = await fetch(`${API_URL}?action=participants&round=${statusData.current_round}`);
-        if (participantsResponse.ok) {
-          const participantsData = await participantsResponse.json();
-          setParticipants(participantsData.participants || []);
-        }
+        // Fetch participants page by page: the draw needs every ticket of the round
+        setParticipants(await fetchAllParticipants(statusData.current_round));
         
         // Fetch winners
         const winnersResponse = await fetch(`${API_URL}?action=winners&round=${statusData.current_round}`);